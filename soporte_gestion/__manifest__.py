@@ -13,14 +13,19 @@
 
 {
 'name': 'Soporte Técnico',
-'version': '16.0.1.0.0',
+'version': '16.0.1.5.0',
 'summary': 'Gestión de tickets de soporte, contratos, servicios y satisfacción',
 'category': 'Services/Helpdesk',
 'author': 'José Luis Ruiz Verdugo',
 'license': 'AGPL-3',
 'depends': ['base', 'account','hr', 'calendar', 'product'],
+'external_dependencies': {'python': ['numpy']},
 'data': [
 'security/ir.model.access.csv',
+'data/ir_cron.xml',
+'data/sla_politica_data.xml',
+'views/vistas_sla_politica.xml',
+'views/vistas_ticket_historial.xml',
 'views/vistas_ticket_incidencia.xml',
 'views/vistas_contrato_soporte.xml',
 'views/vistas_producto_servicio.xml',
@@ -31,6 +36,10 @@
 'views/acciones.xml',
 'views/vistas_menus.xml',
 'views/vistas_facturacion.xml',
+'views/vistas_facturacion_masiva.xml',
+'report/evaluacion_informe_views.xml',
+'views/vistas_kpi_diario.xml',
+'views/vistas_instrumentacion.xml',
 ],
 'application': True,
 'installable': True,
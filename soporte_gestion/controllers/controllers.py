@@ -1,21 +1,217 @@
 # -*- coding: utf-8 -*-
-# from odoo import http
-
-
-# class Support(http.Controller):
-#     @http.route('/support/support', auth='public')
-#     def index(self, **kw):
-#         return "Hello, world"
-
-#     @http.route('/support/support/objects', auth='public')
-#     def list(self, **kw):
-#         return http.request.render('support.listing', {
-#             'root': '/support/support',
-#             'objects': http.request.env['support.support'].search([]),
-#         })
-
-#     @http.route('/support/support/objects/<model("support.support"):obj>', auth='public')
-#     def object(self, obj, **kw):
-#         return http.request.render('support.object', {
-#             'object': obj
-#         })
+"""
+Endpoints HTTP del módulo de soporte.
+
+Exportación en streaming de tickets, historial y evaluaciones.
+
+La exportación estándar carga todos los registros (y sus relaciones) en
+memoria antes de responder. Aquí se recorre cada modelo por rangos de id
+(paginación por clave, sin OFFSET) y cada lote se escribe y se envía antes
+de leer el siguiente, así que la memoria no crece con el número de filas
+y el CSV empieza a descargarse de inmediato.
+
+    /soporte_gestion/export/<conjunto>?formato=csv|xlsx&desde=AAAA-MM-DD&hasta=AAAA-MM-DD
+
+Alta masiva e idempotente de tickets para sistemas de monitorización
+(JSON-RPC, cada ticket con su 'external_ref'):
+
+    POST /soporte_gestion/api/tickets  {"params": {"tickets": [...]}}
+"""
+import csv
+import io
+import tempfile
+
+import xlsxwriter
+
+from odoo import api, fields, http, _
+from odoo.http import request, content_disposition, Response
+from odoo.exceptions import UserError
+
+# Registros leídos por consulta
+TAMANO_LOTE = 2000
+# Tamaño de bloque al enviar el fichero XLSX ya generado
+TAMANO_BLOQUE = 64 * 1024
+# Filas de una hoja XLSX (incluida la cabecera)
+MAX_FILAS_XLSX = 1048576
+# Tickets admitidos por petición en la API de alta
+MAX_ALTA_LOTE = 5000
+
+# Conjuntos exportables: modelo, campo de fecha para el filtro y columnas
+CONJUNTOS = {
+    'tickets': {
+        'model': 'ticket.incidencia',
+        'date_field': 'create_date',
+        'fields': [
+            'name', 'partner_id', 'technician_id', 'state', 'equipo_afectado',
+            'create_date', 'event_start', 'event_stop', 'sla_deadline',
+            'sla_escalado', 'invoice_id',
+        ],
+    },
+    'historial': {
+        'model': 'ticket.historial',
+        'date_field': 'date',
+        'fields': ['incidencia_id', 'date', 'user_id', 'resumen'],
+    },
+    'evaluaciones': {
+        'model': 'evaluacion',
+        'date_field': 'create_date',
+        'fields': ['incidencia_id', 'create_date', 'rating', 'comments'],
+    },
+}
+
+
+class SoporteExportacion(http.Controller):
+
+    @http.route('/soporte_gestion/export/<string:conjunto>', type='http', auth='user')
+    def exportar(self, conjunto, formato='csv', desde=None, hasta=None, **kw):
+        """
+        Devuelve el conjunto pedido como respuesta HTTP por trozos. El
+        generador abre su propio cursor porque el de la petición se cierra
+        en cuanto el controlador devuelve la respuesta.
+        """
+        if conjunto not in CONJUNTOS or formato not in ('csv', 'xlsx'):
+            raise request.not_found()
+        definicion = CONJUNTOS[conjunto]
+        # Comprobamos permisos ahora, mientras aún podemos responder con un error
+        request.env[definicion['model']].check_access_rights('read')
+
+        domain = []
+        if desde:
+            domain.append((definicion['date_field'], '>=', _fecha(desde)))
+        if hasta:
+            domain.append((definicion['date_field'], '<', fields.Date.add(_fecha(hasta), days=1)))
+
+        if formato == 'xlsx' and request.env[definicion['model']].search_count(domain) >= MAX_FILAS_XLSX:
+            raise UserError(_("La exportación supera el máximo de filas de una hoja XLSX; use CSV."))
+
+        generador = _filas_csv if formato == 'csv' else _filas_xlsx
+        stream = generador(
+            request.env.registry, request.env.uid, dict(request.env.context),
+            definicion, domain,
+        )
+        filename = f"{conjunto}_{fields.Date.today()}.{formato}"
+        content_type = (
+            'text/csv; charset=utf-8' if formato == 'csv'
+            else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        return Response(stream, headers=[
+            ('Content-Type', content_type),
+            ('Content-Disposition', content_disposition(filename)),
+            # Evita que un proxy nginx acumule la respuesta antes de enviarla
+            ('X-Accel-Buffering', 'no'),
+        ], direct_passthrough=True)
+
+    @http.route('/soporte_gestion/api/tickets', type='json', auth='user', methods=['POST'])
+    def alta_tickets(self, tickets, **kw):
+        """
+        Crea en una sola transacción los tickets recibidos y devuelve, en el
+        mismo orden, su id y referencia y si ya existían ('duplicado').
+        Reenviar el mismo lote es seguro: las referencias externas ya
+        registradas no vuelven a crearse. Si dos peticiones simultáneas traen
+        la misma referencia, la restricción única hace fallar a una de ellas
+        y su reintento la devuelve como duplicada.
+        """
+        if not isinstance(tickets, list) or not tickets:
+            raise UserError(_("Se espera una lista de tickets."))
+        if len(tickets) > MAX_ALTA_LOTE:
+            raise UserError(_("Como máximo se admiten %s tickets por petición.", MAX_ALTA_LOTE))
+        return request.env['ticket.incidencia']._alta_externa(tickets)
+
+
+def _fecha(valor):
+    """Fecha AAAA-MM-DD de un parámetro de la URL; UserError si no lo es."""
+    try:
+        return fields.Date.to_date(valor)
+    except ValueError:
+        raise UserError(_("Fecha no válida: %s. Use el formato AAAA-MM-DD.", valor))
+
+
+def _lotes(registry, uid, context, definicion, domain):
+    """
+    Genera primero las cabeceras y después las filas en lotes de TAMANO_LOTE
+    registros, paginando por id > último id. Un único cursor (una sola
+    transacción) da una vista coherente de los datos durante toda la
+    exportación.
+    """
+    with registry.cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        Model = env[definicion['model']]
+        field_names = definicion['fields']
+        yield [Model._fields[fname]._description_string(env) for fname in field_names]
+        selections = {
+            fname: dict(Model._fields[fname]._description_selection(env))
+            for fname in field_names if Model._fields[fname].type == 'selection'
+        }
+        last_id = 0
+        while True:
+            records = Model.search_read(
+                domain + [('id', '>', last_id)], field_names,
+                order='id', limit=TAMANO_LOTE,
+            )
+            if not records:
+                break
+            last_id = records[-1]['id']
+            yield [
+                [_formatear(row[fname], selections.get(fname)) for fname in field_names]
+                for row in records
+            ]
+            # Soltamos la caché del ORM para que la memoria no crezca con los lotes
+            env.invalidate_all()
+
+
+def _formatear(value, selection=None):
+    """Valor de search_read convertido a texto plano para la celda."""
+    if value is False or value is None:
+        return ''
+    if selection is not None:
+        return selection.get(value, value)
+    if isinstance(value, tuple):
+        # Many2one: (id, nombre)
+        return value[1]
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(v) for v in value)
+    return str(value)
+
+
+def _filas_csv(registry, uid, context, definicion, domain):
+    """Cada lote se escribe en un buffer que se vacía tras enviarlo."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel detecte UTF-8 al abrir el CSV
+    buffer.write('\ufeff')
+    lotes = _lotes(registry, uid, context, definicion, domain)
+    writer.writerow(next(lotes))
+    # La cabecera sale antes de la primera consulta de datos
+    yield buffer.getvalue().encode('utf-8')
+    for filas in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(filas)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _filas_xlsx(registry, uid, context, definicion, domain):
+    """
+    XLSX es un ZIP que solo puede cerrarse al final: xlsxwriter en modo
+    constant_memory vuelca cada fila a disco según se escribe, y al terminar
+    se envía el fichero por bloques. La memoria se mantiene plana, aunque
+    los primeros bytes no llegan hasta completar la hoja.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        workbook = xlsxwriter.Workbook(tmp, {'constant_memory': True, 'in_memory': False})
+        sheet = workbook.add_worksheet()
+        bold = workbook.add_format({'bold': True})
+        lotes = _lotes(registry, uid, context, definicion, domain)
+        sheet.write_row(0, 0, next(lotes), bold)
+        row_index = 1
+        for filas in lotes:
+            for fila in filas:
+                sheet.write_row(row_index, 0, fila)
+                row_index += 1
+        workbook.close()
+        tmp.seek(0)
+        while True:
+            bloque = tmp.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            yield bloque
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Regenera las variantes redimensionadas de la foto de los tickets.
+
+Hasta la 16.0.1.0.0, image_medium e image_small eran copias de la imagen
+completa (hasta 1024px). Ahora se guardan a 512px y 128px: las recalculamos
+por lotes y eliminamos los adjuntos duplicados que pudieran quedar para un
+mismo ticket y campo.
+"""
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+CAMPOS_IMAGEN = ('image', 'image_medium', 'image_small')
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Ticket = env['ticket.incidencia']
+
+    cr.execute("""
+        SELECT DISTINCT res_id
+          FROM ir_attachment
+         WHERE res_model = 'ticket.incidencia'
+           AND res_field = 'image'
+           AND res_id IS NOT NULL
+    """)
+    ticket_ids = [row[0] for row in cr.fetchall()]
+    _logger.info("Redimensionando imágenes de %s tickets", len(ticket_ids))
+
+    for batch in split_every(500, ticket_ids):
+        tickets = Ticket.browse(batch)
+        for fname in ('image_medium', 'image_small'):
+            env.add_to_compute(Ticket._fields[fname], tickets)
+        tickets.flush_recordset(['image_medium', 'image_small'])
+        env.invalidate_all()
+
+    # Si quedara más de un adjunto por ticket y campo, conservamos el más reciente
+    cr.execute("""
+        SELECT a.id
+          FROM ir_attachment a
+          JOIN ir_attachment b
+            ON b.res_model = a.res_model
+           AND b.res_field = a.res_field
+           AND b.res_id = a.res_id
+           AND b.id > a.id
+         WHERE a.res_model = 'ticket.incidencia'
+           AND a.res_field IN %s
+    """, [CAMPOS_IMAGEN])
+    duplicated = list({row[0] for row in cr.fetchall()})
+    if duplicated:
+        _logger.info("Eliminando %s adjuntos de imagen duplicados", len(duplicated))
+        # unlink() marca los ficheros para que el recolector del filestore los borre
+        env['ir.attachment'].browse(duplicated).unlink()
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+product.template.ticket_ids usaba su propia tabla de relación
+(ticket_product_rel) que nunca se rellenaba desde el ticket. Ahora la
+relación se lee de ticket_producto_rel a través de las variantes, así
+que la tabla antigua sobra.
+"""
+
+
+def migrate(cr, version):
+    cr.execute("DROP TABLE IF EXISTS ticket_product_rel")
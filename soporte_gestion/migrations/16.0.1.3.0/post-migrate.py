@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Asigna la política de SLA a los contratos existentes.
+
+La columna sla_politica_id se crea antes de cargar las políticas por defecto,
+así que los contratos previos quedan sin política: la recalculamos ahora que
+ya existen. Los tickets abiertos no se tocan; recibirán su plazo al asignarse.
+"""
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Contrato = env['soporte.contrato']
+    contratos = Contrato.with_context(active_test=False).search([('sla_politica_id', '=', False)])
+    _logger.info("Asignando política SLA a %s contratos", len(contratos))
+    env.add_to_compute(Contrato._fields['sla_politica_id'], contratos)
+    contratos.flush_recordset(['sla_politica_id'])
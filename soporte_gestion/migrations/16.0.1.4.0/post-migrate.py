@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Rellena los contadores diarios de KPI con la actividad previa.
+
+A partir de esta versión los contadores se actualizan en cada alta y cambio
+de estado; para los tickets existentes los reconstruimos una vez desde los
+códigos del historial. Las entradas anteriores a los códigos solo tienen la
+nota, pero sus textos son exactamente las etiquetas de los códigos: primero
+les asignamos el código que corresponde a su nota.
+"""
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.addons.soporte_gestion.models.ticket_historial import CODIGOS_HISTORIAL
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    cr.execute("""
+        UPDATE ticket_historial AS h
+           SET code = m.code
+          FROM unnest(%s::varchar[], %s::text[]) AS m(code, notes)
+         WHERE h.code IS NULL
+           AND h.notes = m.notes
+    """, [[code for code, _label in CODIGOS_HISTORIAL], [label for _code, label in CODIGOS_HISTORIAL]])
+    _logger.info("Asignado el código a %s entradas antiguas del historial", cr.rowcount)
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _logger.info("Reconstruyendo contadores diarios de KPI desde el historial")
+    env['soporte.kpi.diario']._reconstruir()
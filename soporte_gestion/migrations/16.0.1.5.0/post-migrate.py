@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Marca los técnicos de soporte existentes.
+
+A partir de esta versión la asignación automática solo reparte tickets entre
+los empleados marcados como técnicos de soporte. Marcamos los que ya tienen
+ficha de técnico o tickets asignados, para que la asignación siga teniendo
+candidatos tras la actualización, y recalculamos su carga de trabajo.
+"""
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    cr.execute("""
+        UPDATE hr_employee
+           SET soporte_tecnico = TRUE
+         WHERE soporte_tecnico IS NOT TRUE
+           AND (id IN (SELECT employee_id FROM soporte_tecnico)
+                OR id IN (SELECT technician_id FROM ticket_incidencia WHERE technician_id IS NOT NULL))
+    """)
+    _logger.info("Marcados %s empleados como técnicos de soporte", cr.rowcount)
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['hr.employee']._cron_actualizar_carga_trabajo()
@@ -1,12 +1,18 @@
+from . import calendar_mixin
+from . import instrumentacion
 from . import ticket_incidencia
 from . import account_move
+from . import sla_politica
 from . import soporte_contrato
 from . import producto_servicio
 from . import evaluacion
 from . import cita_visita_soporte
 from . import ticket_historial
+from . import ticket_aviso
 from . import calendar_event
 from . import tecnico
+from . import res_company
+from . import kpi_diario
 
 
 
@@ -13,3 +13,12 @@ class AccountMove(models.Model):
         help='Ticket de soporte asociado a este asiento contable'  
         # Texto de ayuda que explica qué representa este campo
     )
+
+    # Tickets facturados en este asiento (una factura puede agrupar
+    # todos los tickets de un cliente)
+    ticket_ids = fields.One2many(
+        comodel_name='ticket.incidencia',
+        inverse_name='invoice_id',
+        string='Tickets facturados',
+        readonly=True
+    )
@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from odoo import models
+
+
+class SoporteCalendarMixin(models.AbstractModel):
+    """
+    Servicio compartido de sincronización con calendar.event.
+
+    Los modelos que lo heredan deben tener un campo Many2one 'event_id'
+    hacia calendar.event e implementar _prepare_event_vals(), que devuelve
+    los valores del evento o None si el registro no debe tener evento.
+    """
+    _name = 'soporte.calendar.mixin'
+    _description = 'Sincronización de eventos de calendario de soporte'
+
+    def _prepare_event_vals(self):
+        """
+        Valores del evento de calendario de este registro,
+        o None si el evento debe eliminarse (o no crearse).
+        """
+        raise NotImplementedError()
+
+    def _sync_calendar_events(self):
+        """
+        Sincroniza los eventos de todo el recordset por lotes:
+        - Eventos nuevos: un único calendar.event.create(vals_list).
+        - Eventos existentes: solo se escriben los campos que han cambiado,
+          agrupando en un mismo write los eventos con valores idénticos.
+        - Eventos sobrantes: un único unlink.
+        """
+        Event = self.env['calendar.event']
+        to_unlink = Event
+        to_create = self.browse()
+        create_vals = []
+        # {clave de valores: (valores, eventos)}
+        to_write = defaultdict(lambda: [None, Event])
+
+        for rec in self:
+            vals = rec._prepare_event_vals()
+            if not vals:
+                to_unlink |= rec.event_id
+                continue
+            if not rec.event_id:
+                to_create |= rec
+                create_vals.append(vals)
+                continue
+            changed = {
+                fname: value for fname, value in vals.items()
+                if not self._event_value_equal(rec.event_id, fname, value)
+            }
+            if changed:
+                group = to_write[self._event_vals_key(changed)]
+                group[0] = changed
+                group[1] |= rec.event_id
+
+        if to_unlink:
+            self._set_event_ids(self.filtered(lambda r: r.event_id in to_unlink), [])
+            to_unlink.unlink()
+        for vals, events in to_write.values():
+            events.write(vals)
+        if create_vals:
+            events = Event.create(create_vals)
+            self._set_event_ids(to_create, events.ids)
+
+    def _set_event_ids(self, records, event_ids):
+        """
+        Enlaza (o desenlaza si event_ids está vacío) los eventos con los
+        registros en una sola sentencia UPDATE, sin pasar por write() para
+        no relanzar la sincronización ni generar una escritura por registro.
+        """
+        if not records:
+            return
+        records.flush_recordset(['event_id'])
+        if event_ids:
+            self.env.cr.execute(f"""
+                UPDATE "{records._table}" AS t
+                   SET event_id = v.event_id
+                  FROM unnest(%s::int[], %s::int[]) AS v(id, event_id)
+                 WHERE t.id = v.id
+            """, [records.ids, list(event_ids)])
+        else:
+            self.env.cr.execute(
+                f'UPDATE "{records._table}" SET event_id = NULL WHERE id IN %s',
+                [tuple(records.ids)],
+            )
+        records.invalidate_recordset(['event_id'])
+
+    def _event_value_equal(self, event, fname, value):
+        """
+        Compara un valor calculado con el almacenado en el evento, pasándolo
+        por la misma conversión que haría el ORM al escribirlo (HTML saneado,
+        comandos x2many, ids de Many2one...).
+        """
+        field = event._fields[fname]
+        cache_value = field.convert_to_cache(value, event)
+        return field.convert_to_record(cache_value, event) == event[fname]
+
+    @staticmethod
+    def _event_vals_key(vals):
+        """
+        Clave hashable para agrupar eventos que reciben los mismos valores.
+        """
+        return tuple(sorted((fname, repr(value)) for fname, value in vals.items()))
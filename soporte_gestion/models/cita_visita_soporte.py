@@ -1,34 +1,87 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+import math
+
+import pytz
+from markupsafe import Markup
+
+from . import optimizador_rutas
+from .instrumentacion import instrumentado
 
 class CitaVisitaSoporte(models.Model):
     _name = 'cita.visita.soporte'
     _description = 'Cita de Visita de Soporte'
-    # Habilitamos hilos de conversación y tareas del buzón de entrada
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    # Habilitamos hilos de conversación, tareas del buzón de entrada
+    # y la sincronización de calendario por lotes
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'soporte.calendar.mixin']
 
-    # Relacionamos la cita con una incidencia (ticket de soporte)
+    # Relacionamos la cita con una incidencia (ticket de soporte);
+    # las visitas preventivas de contrato no tienen incidencia
     incidencia_id = fields.Many2one(
         'ticket.incidencia',
         string='Incidencia',
-        required=True,          # Obligatorio
         ondelete='cascade',     # Si borras la incidencia, borra la cita
-        tracking=True           # Seguimiento en chatter
+        tracking=True,          # Seguimiento en chatter
+        index=True              # Citas de cada ticket
+    )
+    # Contrato y ocurrencia de la que procede una visita preventiva recurrente
+    contrato_id = fields.Many2one(
+        'soporte.contrato',
+        string='Contrato',
+        ondelete='cascade',
+        readonly=True
+    )
+    recurrencia_fecha = fields.Date(
+        string='Ocurrencia',
+        readonly=True,
+        copy=False
+    )
+    # Cliente visitado: el de la incidencia o, si no la hay, el del contrato
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Cliente',
+        compute='_compute_partner_id',
+        store=True
     )
     # Asignamos un técnico responsable de la visita
     technician_id = fields.Many2one(
         'res.users',
         string='Técnico',
         required=True,
-        tracking=True
+        tracking=True,
+        index=True
     )
     # Fecha y hora de la cita
     date = fields.Datetime(
         string='Fecha y Hora',
         required=True,
         default=fields.Datetime.now,  # Por defecto, ahora
+        tracking=True,
+        index=True                    # Filtro "Hoy" y vista de calendario
+    )
+    # Duración prevista de la visita, en horas
+    duracion = fields.Float(
+        string='Duración (horas)',
+        required=True,
+        default=1.0,
         tracking=True
     )
+    # Fin de la visita, almacenado para poder consultar solapes por índice
+    date_end = fields.Datetime(
+        string='Fin',
+        compute='_compute_date_end',
+        store=True,
+        index=True
+    )
+    # Marca las citas programadas que se solapan con otra del mismo técnico
+    # cuando se programan en modo "marcar" en lugar de rechazarlas
+    solapada = fields.Boolean(
+        string='Solapada',
+        readonly=True,
+        copy=False
+    )
     # Estados por los que pasa la cita
     state = fields.Selection([
         ('draft', 'Borrador'),
@@ -50,63 +103,305 @@ class CitaVisitaSoporte(models.Model):
         copy=False
     )
 
-    def action_schedule(self):
-        """Programa la cita y crea o actualiza el evento de calendario."""
+    # Campos de la cita que se reflejan en el evento de calendario
+    _CAMPOS_EVENTO = ('state', 'date', 'duracion', 'technician_id', 'description', 'incidencia_id')
+    # Campos que pueden provocar un solape entre citas programadas
+    _CAMPOS_SOLAPE = ('state', 'date', 'duracion', 'technician_id')
+
+    _sql_constraints = [
+        ('duracion_positiva', 'CHECK(duracion > 0)', 'La duración de la cita debe ser positiva.'),
+        ('incidencia_o_contrato', 'CHECK(incidencia_id IS NOT NULL OR contrato_id IS NOT NULL)',
+         'La cita debe corresponder a una incidencia o a un contrato.'),
+        # Una visita por ocurrencia; su índice sirve también para buscar las
+        # ocurrencias ya generadas de cada contrato
+        ('ocurrencia_unica', 'unique(contrato_id, recurrencia_fecha)',
+         'Ya existe la visita de esa ocurrencia del contrato.'),
+    ]
+
+    def init(self):
+        # Búsqueda de solapes: técnico + intervalo de las citas programadas
+        tools.create_index(
+            self._cr, 'cita_visita_soporte_tecnico_fecha_idx',
+            self._table, ['technician_id', 'date'], where="state = 'scheduled'"
+        )
+        tools.create_index(
+            self._cr, 'cita_visita_soporte_intervalo_idx',
+            self._table, ['tsrange(date, date_end)'], method='gist', where="state = 'scheduled'"
+        )
+
+    @api.depends('date', 'duracion')
+    def _compute_date_end(self):
+        for rec in self:
+            rec.date_end = rec.date and rec.date + timedelta(hours=rec.duracion or 0.0)
+
+    @api.depends('incidencia_id.partner_id', 'contrato_id.partner_id')
+    def _compute_partner_id(self):
         for rec in self:
-            # Solo citas en borrador
-            if rec.state != 'draft':
-                continue
-
-            # Validamos que la incidencia tenga cliente asignado
-            if not rec.incidencia_id.partner_id:
-                raise UserError(_("La incidencia debe tener un cliente asignado."))
-
-            # No permitimos fechas pasadas
-            if rec.date < fields.Datetime.now():
-                raise UserError(_("La fecha de la cita no puede ser en el pasado."))
-
-            # Preparamos los valores para el evento
-            event_vals = {
-                'name': _('Visita Soporte: %s') % rec.incidencia_id.name,
-                'start': rec.date,
-                'stop': rec.date,  # Para duración, ajustar stop > start
-                'user_id': rec.technician_id.id,
-                'partner_ids': [(4, rec.incidencia_id.partner_id.id)],
-                'description': rec.description,
-            }
-
-            if rec.event_id:
-                # Si ya existe evento, solo lo actualizamos si algo cambió
-                has_changes = any(
-                    event_vals[k] != getattr(rec.event_id, k)
-                    for k in event_vals
-                )
-                if has_changes:
-                    rec.event_id.write(event_vals)
-            else:
-                # Creamos un nuevo evento y lo vinculamos
-                event = self.env['calendar.event'].create(event_vals)
-                rec.event_id = event.id
-
-            # Marcamos como programada
-            rec.state = 'scheduled'
+            rec.partner_id = rec.incidencia_id.partner_id or rec.contrato_id.partner_id
+
+    def _referencia(self):
+        """Referencia de la incidencia o, en las visitas preventivas, del contrato."""
+        self.ensure_one()
+        return (self.incidencia_id or self.contrato_id).name
+
+    def _comprobar_solapamientos(self):
+        """
+        Comprueba en una sola consulta si alguna de las citas programadas del
+        recordset se solapa con otra cita programada del mismo técnico (incluidas
+        las del propio lote). Por defecto lanza un error; con el contexto
+        'soporte_marcar_solapes' marca las citas afectadas en lugar de rechazarlas.
+        """
+        citas = self.filtered(lambda r: r.state == 'scheduled')
+        if not citas:
+            return
+        self.flush_model(['technician_id', 'state', 'date', 'date_end'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (v.id) v.id, c.id
+              FROM unnest(%s::int[]) AS v(id)
+              JOIN cita_visita_soporte AS n ON n.id = v.id
+              JOIN cita_visita_soporte AS c
+                ON c.technician_id = n.technician_id
+               AND c.state = 'scheduled'
+               AND c.id != n.id
+               AND tsrange(c.date, c.date_end) && tsrange(n.date, n.date_end)
+             ORDER BY v.id, c.date
+        """, [citas.ids])
+        solapes = dict(self.env.cr.fetchall())
 
+        if self.env.context.get('soporte_marcar_solapes'):
+            marcadas = citas.filtered(lambda r: r.id in solapes)
+            limpias = (citas - marcadas).filtered('solapada')
+            if marcadas:
+                super(CitaVisitaSoporte, marcadas).write({'solapada': True})
+            if limpias:
+                super(CitaVisitaSoporte, limpias).write({'solapada': False})
+            return
+        if solapes:
+            cita = self.browse(next(iter(solapes)))
+            otra = self.browse(solapes[cita.id])
+            raise UserError(_(
+                "El técnico %(tecnico)s ya tiene una visita programada (%(otra)s) "
+                "que se solapa con la cita de %(cita)s.",
+                tecnico=cita.technician_id.name,
+                otra=otra._referencia(),
+                cita=cita._referencia(),
+            ))
+        limpias = citas.filtered('solapada')
+        if limpias:
+            super(CitaVisitaSoporte, limpias).write({'solapada': False})
+
+    @instrumentado
+    def action_schedule(self):
+        """Programa las citas y crea o actualiza sus eventos de calendario."""
+        # Solo citas en borrador
+        citas = self.filtered(lambda r: r.state == 'draft')
+        if not citas:
+            return
+
+        # Validamos que las citas tengan cliente asignado
+        if citas.filtered(lambda r: not r.partner_id):
+            raise UserError(_("La incidencia debe tener un cliente asignado."))
+
+        # No permitimos fechas pasadas
+        now = fields.Datetime.now()
+        if citas.filtered(lambda r: r.date < now):
+            raise UserError(_("La fecha de la cita no puede ser en el pasado."))
+
+        # Marcamos como programadas; write() sincroniza los eventos por lotes
+        citas.write({'state': 'scheduled'})
+
+    @instrumentado
     def action_done(self):
         """Marcar la cita como realizada."""
-        for rec in self:
-            rec.state = 'done'
+        self.write({'state': 'done'})
 
+    @instrumentado
     def action_cancel(self):
-        """Cancelar cita y eliminar evento asociado."""
-        for rec in self:
-            # Si hay evento en calendario, lo borramos
-            if rec.event_id:
-                rec.event_id.unlink()
-                rec.event_id = False
-            rec.state = 'cancelled'
+        """Cancelar cita y eliminar evento asociado (lo hace write())."""
+        self.write({'state': 'cancelled'})
+
+    def _prepare_event_vals(self):
+        """
+        Valores del evento de calendario de la cita.
+        Solo las citas programadas o realizadas tienen evento.
+        """
+        self.ensure_one()
+        if self.state not in ('scheduled', 'done'):
+            return None
+        return {
+            'name': _('Visita Soporte: %s') % self._referencia(),
+            'start': self.date,
+            'stop': self.date_end,
+            'user_id': self.technician_id.id,
+            'partner_ids': [(4, self.partner_id.id)],
+            'description': self.description,
+            'cita_visita_id': self.id,
+        }
+
+    def action_optimizar_rutas(self):
+        """
+        Reordena las visitas programadas de los técnicos y días de las citas
+        seleccionadas para minimizar desplazamientos.
+        """
+        dias = defaultdict(lambda: self.env['res.users'])
+        for rec in self.filtered(lambda r: r.state == 'scheduled'):
+            dias[rec._dia_local()] |= rec.technician_id
+        for dia, tecnicos in dias.items():
+            self._planificar_rutas(dia, tecnicos)
+        return True
+
+    @api.model
+    def _cron_planificar_rutas(self):
+        """
+        Tarea programada (cron) que planifica las rutas del día siguiente.
+        """
+        self._planificar_rutas(fields.Date.context_today(self) + timedelta(days=1))
 
     @api.model
-    def create(self, vals):
-        # Llamada al método original: aquí podrías agregar notificaciones automáticas
-        rec = super().create(vals)
-        return rec
+    @instrumentado
+    def _planificar_rutas(self, dia, tecnicos=None):
+        """
+        Planificador de rutas diario:
+        - Lee de una vez las citas programadas del día (de todos los técnicos
+          o de los indicados) con las coordenadas del cliente de la incidencia.
+        - Por técnico, ordena las visitas con vecino más cercano + 2-opt sobre
+          una matriz de distancias NumPy, empezando por su primera visita.
+        - Encadena horarios desde la primera hora original, sumando duración y
+          tiempo de trayecto estimado, y guarda todas las fechas en una sola
+          sentencia; después resincroniza los eventos por lotes.
+        - La sentencia se salta el seguimiento del campo fecha, así que cada
+          visita movida recibe una nota con la hora anterior y la nueva,
+          creadas todas con _message_log_batch.
+        Las visitas sin coordenadas se dejan al final, en su orden original.
+        """
+        inicio_utc, fin_utc = self._limites_dia_utc(dia)
+        domain = [
+            ('state', '=', 'scheduled'),
+            ('date', '>=', inicio_utc),
+            ('date', '<', fin_utc),
+        ]
+        if tecnicos:
+            domain.append(('technician_id', 'in', tecnicos.ids))
+        citas = self.search(domain, order='technician_id, date, id')
+        if not citas:
+            return citas
+
+        velocidad = float(self.env['ir.config_parameter'].sudo().get_param(
+            'soporte_gestion.velocidad_media_kmh', 40.0)) or 40.0
+        grupos = defaultdict(lambda: self.browse())
+        for cita in citas:
+            grupos[cita.technician_id.id] |= cita
+
+        nuevas_fechas = {}
+        for grupo in grupos.values():
+            nuevas_fechas.update(grupo._planificar_ruta_tecnico(velocidad))
+
+        previas = {cita.id: cita.date for cita in citas}
+        ids = [cita_id for cita_id, fecha in nuevas_fechas.items() if fecha != previas[cita_id]]
+        if ids:
+            self.flush_model(['date', 'duracion'])
+            self.env.cr.execute("""
+                UPDATE cita_visita_soporte AS c
+                   SET date = v.date,
+                       date_end = v.date + c.duracion * interval '1 hour',
+                       write_uid = %s,
+                       write_date = (now() at time zone 'UTC')
+                  FROM unnest(%s::int[], %s::timestamp[]) AS v(id, date)
+                 WHERE c.id = v.id
+            """, [self.env.uid, ids, [nuevas_fechas[cita_id] for cita_id in ids]])
+            citas.invalidate_recordset(['date', 'date_end', 'write_uid', 'write_date'])
+            movidas = self.browse(ids)
+            notas = {}
+            for cita_id in ids:
+                antes = fields.Datetime.context_timestamp(self, previas[cita_id])
+                despues = fields.Datetime.context_timestamp(self, nuevas_fechas[cita_id])
+                notas[cita_id] = Markup("Ruta planificada: %s → %s") % (
+                    antes.strftime('%H:%M'), despues.strftime('%H:%M'))
+            movidas._message_log_batch(bodies=notas)
+            movidas.with_context(soporte_marcar_solapes=True)._comprobar_solapamientos()
+            movidas._sync_calendar_events()
+            self.env['hr.employee']._programar_carga_trabajo()
+        return citas
+
+    def _planificar_ruta_tecnico(self, velocidad):
+        """
+        Orden y horarios de las citas de un técnico en un día.
+        Devuelve {cita_id: nueva fecha (UTC naive)}.
+        """
+        con_coords = self.filtered(lambda r: r.partner_id.partner_latitude
+                                   or r.partner_id.partner_longitude)
+        sin_coords = self - con_coords
+        orden = con_coords
+        trayectos = [0.0] * len(con_coords)
+        if len(con_coords) > 1:
+            coords = [
+                (r.partner_id.partner_latitude, r.partner_id.partner_longitude)
+                for r in con_coords
+            ]
+            dist = optimizar_rutas.matriz_distancias(coords)
+            ruta = optimizar_rutas.optimizar_ruta(dist)
+            orden = self.browse([con_coords[i].id for i in ruta])
+            trayectos = [0.0] + [float(dist[a, b]) for a, b in zip(ruta[:-1], ruta[1:])]
+        trayectos += [0.0] * len(sin_coords)
+
+        hora = min(self.mapped('date'))
+        fechas = {}
+        for cita, km in zip(orden | sin_coords, trayectos):
+            # Redondeamos la llegada a múltiplos de 5 minutos
+            minutos = math.ceil(km / velocidad * 60 / 5) * 5
+            hora += timedelta(minutes=minutos)
+            fechas[cita.id] = hora
+            hora += timedelta(hours=cita.duracion)
+        return fechas
+
+    def _dia_local(self):
+        """Día de la cita en la zona horaria del usuario."""
+        self.ensure_one()
+        return fields.Datetime.context_timestamp(self, self.date).date()
+
+    @api.model
+    def _limites_dia_utc(self, dia):
+        """Inicio y fin (UTC naive) de un día local del usuario."""
+        tz = pytz.timezone(self.env.context.get('tz') or self.env.user.tz or 'UTC')
+        inicio = tz.localize(datetime.combine(dia, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+        fin = tz.localize(datetime.combine(dia + timedelta(days=1), time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+        return inicio, fin
+
+    @api.model_create_multi
+    @instrumentado
+    def create(self, vals_list):
+        """
+        Tras crear las citas:
+        - Las que ya nacen programadas (p. ej. las visitas recurrentes de
+          contrato) se comprueban contra solapes y reciben su evento de
+          calendario, todo por lotes.
+        - Adelanta el recálculo de la carga de trabajo de los técnicos.
+        """
+        citas = super().create(vals_list)
+        programadas = citas.filtered(lambda r: r.state == 'scheduled')
+        if programadas:
+            programadas._comprobar_solapamientos()
+            programadas._sync_calendar_events()
+        if citas.technician_id:
+            self.env['hr.employee']._programar_carga_trabajo()
+        return citas
+
+    @instrumentado
+    def write(self, vals):
+        """
+        Tras modificar una cita:
+        - Comprueba solapes con otras citas del técnico (una consulta por lote).
+        - Resincroniza por lotes los eventos de calendario si ha cambiado algún
+          campo que se refleje en ellos.
+        - Adelanta el recálculo de la carga de trabajo de los técnicos.
+        """
+        tecnicos = self.technician_id
+        res = super().write(vals)
+        if any(field in vals for field in self._CAMPOS_SOLAPE):
+            self._comprobar_solapamientos()
+        if any(field in vals for field in self._CAMPOS_EVENTO):
+            self._sync_calendar_events()
+        if any(field in vals for field in ('state', 'date', 'technician_id')):
+            if tecnicos | self.technician_id:
+                self.env['hr.employee']._programar_carga_trabajo()
+        return res
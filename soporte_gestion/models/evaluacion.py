@@ -1,6 +1,6 @@
 # models/evaluacion_satisfaccion.py
 
-from odoo import models, fields
+from odoo import models, fields, api
 
 class Evaluacion(models.Model):
     _name = 'evaluacion'
@@ -10,7 +10,8 @@ class Evaluacion(models.Model):
     incidencia_id = fields.Many2one(
         'ticket.incidencia',
         string='Incidencia',
-        help='Ticket de soporte al que corresponde esta evaluación'
+        help='Ticket de soporte al que corresponde esta evaluación',
+        index=True
     )
 
     # Permite al usuario elegir una nota del 1 al 5, con etiquetas claras
@@ -30,3 +31,30 @@ class Evaluacion(models.Model):
         string='Comentarios',
         help='Observaciones o sugerencias del cliente sobre el servicio'
     )
+
+    # Puntuación numérica (1-5, 0 sin calificar) guardada, para agregar
+    # directamente en SQL
+    score = fields.Integer(
+        string='Puntuación',
+        compute='_compute_score',
+        store=True
+    )
+
+    # Técnico y cliente del ticket, guardados para los informes de satisfacción
+    technician_id = fields.Many2one(
+        related='incidencia_id.technician_id',
+        string='Técnico',
+        store=True,
+        index=True
+    )
+    partner_id = fields.Many2one(
+        related='incidencia_id.partner_id',
+        string='Cliente',
+        store=True,
+        index=True
+    )
+
+    @api.depends('rating')
+    def _compute_score(self):
+        for rec in self:
+            rec.score = int(rec.rating) if rec.rating else 0
@@ -0,0 +1,124 @@
+from odoo import models, fields, api, tools
+import functools
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+def _registros(records, args, res=None):
+    """
+    Tamaño de la operación: el recordset de la llamada o, en los métodos de
+    modelo (create por lotes, crons, altas por API) donde llega vacío, la
+    lista de valores recibida o, en su defecto, el recordset devuelto.
+    """
+    if records:
+        return len(records)
+    if args and isinstance(args[0], (list, tuple)):
+        return len(args[0])
+    if isinstance(res, models.BaseModel):
+        return len(res)
+    return 0
+
+
+def instrumentado(func):
+    """
+    Decorador de métodos de negocio: mide duración y número de consultas SQL
+    y, si la llamada supera el umbral configurado, la guarda en soporte.metrica.
+
+    Desactivado (parámetro 'soporte_gestion.instrumentacion_umbral_ms' vacío)
+    solo cuesta una consulta a la caché del registro por llamada.
+
+    Solo se registran las llamadas que terminan bien: si la llamada falla,
+    la transacción puede estar abortada (y la fila se desharía con ella),
+    así que las fallidas lentas van al log y la excepción original se
+    propaga intacta para que Odoo pueda reintentar los conflictos de
+    concurrencia.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        umbral = self.env['soporte.metrica']._umbral_ms()
+        if umbral is None:
+            return func(self, *args, **kwargs)
+        cr = self.env.cr
+        consultas = cr.sql_log_count
+        inicio = time.perf_counter()
+        try:
+            res = func(self, *args, **kwargs)
+        except Exception:
+            duracion_ms = (time.perf_counter() - inicio) * 1000.0
+            if duracion_ms >= umbral:
+                _logger.warning(
+                    "%s.%s falló tras %.0f ms y %s consultas (%s registros)",
+                    self._name, func.__name__, duracion_ms,
+                    cr.sql_log_count - consultas, _registros(self, args),
+                )
+            raise
+        duracion_ms = (time.perf_counter() - inicio) * 1000.0
+        if duracion_ms >= umbral:
+            self.env['soporte.metrica']._registrar(
+                self._name, func.__name__, duracion_ms,
+                cr.sql_log_count - consultas, _registros(self, args, res),
+            )
+        return res
+    return wrapper
+
+
+class SoporteMetrica(models.Model):
+    """
+    Registro de operaciones lentas de los flujos de soporte. Se escribe con
+    un INSERT directo y un cron elimina las entradas antiguas.
+    """
+    _name = 'soporte.metrica'
+    _description = 'Operación lenta de soporte'
+    _order = 'fecha desc, id desc'
+    _rec_name = 'metodo'
+    # Solo inserción directa; fecha y user_id ya dicen cuándo y quién
+    _log_access = False
+
+    fecha = fields.Datetime('Fecha', readonly=True, index=True)
+    modelo = fields.Char('Modelo', readonly=True)
+    metodo = fields.Char('Método', readonly=True)
+    duracion_ms = fields.Float('Duración (ms)', readonly=True, group_operator='max')
+    consultas = fields.Integer('Consultas SQL', readonly=True, group_operator='max')
+    # Tamaño de la operación: recordset de la llamada, lista de valores
+    # recibida o recordset devuelto (ver _registros)
+    registros = fields.Integer('Registros', readonly=True)
+    user_id = fields.Many2one('res.users', 'Usuario', readonly=True)
+
+    @api.model
+    @tools.ormcache()
+    def _umbral_ms(self):
+        """
+        Umbral en milisegundos a partir del cual se registra una operación,
+        o None si la instrumentación está desactivada. Queda en caché hasta
+        que cambia algún parámetro del sistema.
+        """
+        valor = self.env['ir.config_parameter'].sudo().get_param('soporte_gestion.instrumentacion_umbral_ms')
+        try:
+            return float(valor) if valor not in (None, False, '') else None
+        except ValueError:
+            _logger.warning("Umbral de instrumentación no válido: %r", valor)
+            return None
+
+    @api.model
+    def _registrar(self, modelo, metodo, duracion_ms, consultas, registros):
+        self.env.cr.execute("""
+            INSERT INTO soporte_metrica (fecha, modelo, metodo, duracion_ms, consultas, registros, user_id)
+            VALUES (now() AT TIME ZONE 'UTC', %s, %s, %s, %s, %s, %s)
+        """, [modelo, metodo, duracion_ms, consultas, registros, self.env.uid])
+
+    @api.model
+    def _cron_rotar(self):
+        """
+        Tarea programada (cron) que borra las mediciones más antiguas que
+        los días de retención configurados (14 por defecto).
+        """
+        dias = int(self.env['ir.config_parameter'].sudo().get_param(
+            'soporte_gestion.instrumentacion_dias', 14))
+        self.env.cr.execute(
+            "DELETE FROM soporte_metrica WHERE fecha < (now() AT TIME ZONE 'UTC') - %s * interval '1 day'",
+            [dias],
+        )
+        self.invalidate_model()
+
@@ -0,0 +1,91 @@
+# models/optimizador_rutas.py
+"""
+Heurística de rutas para las visitas diarias de los técnicos.
+
+Funciones puras sobre NumPy (sin ORM) para que se puedan probar y medir
+por separado: matriz de distancias haversine, vecino más cercano y mejora
+2-opt sobre un recorrido abierto que parte de la primera visita.
+"""
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0
+
+
+def matriz_distancias(coords):
+    """
+    Matriz de distancias (km) entre todos los puntos.
+    coords: array (n, 2) con latitud y longitud en grados.
+    """
+    coords = np.radians(np.asarray(coords, dtype=float))
+    lat = coords[:, 0][:, None]
+    lon = coords[:, 1][:, None]
+    dlat = lat - lat.T
+    dlon = lon - lon.T
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vecino_mas_cercano(dist, inicio=0):
+    """
+    Recorrido inicial: desde 'inicio', ir siempre al punto no visitado más cercano.
+    """
+    n = len(dist)
+    visitado = np.zeros(n, dtype=bool)
+    ruta = [inicio]
+    visitado[inicio] = True
+    for _i in range(n - 1):
+        candidatos = np.where(visitado, np.inf, dist[ruta[-1]])
+        siguiente = int(np.argmin(candidatos))
+        ruta.append(siguiente)
+        visitado[siguiente] = True
+    return ruta
+
+
+def dos_opt(ruta, dist, max_iter=1000):
+    """
+    Mejora 2-opt de un recorrido abierto con el primer punto fijo.
+    Para cada posición i evalúa de una vez (vectorizado) todas las
+    inversiones ruta[i:j+1] y aplica la mejor mientras reduzca la distancia.
+    """
+    ruta = np.asarray(ruta)
+    n = len(ruta)
+    if n < 4:
+        return ruta.tolist()
+    for _iteracion in range(max_iter):
+        mejorado = False
+        for i in range(1, n - 1):
+            a, b = ruta[i - 1], ruta[i]
+            c = ruta[i + 1:]
+            # Sucesor de cada c; el último punto no tiene sucesor (recorrido abierto)
+            d = np.append(ruta[i + 2:], -1)
+            tiene_sucesor = d >= 0
+            d_seguro = np.where(tiene_sucesor, d, 0)
+            delta = (
+                dist[a, c] - dist[a, b]
+                + np.where(tiene_sucesor, dist[b, d_seguro] - dist[c, d_seguro], 0.0)
+            )
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                j = i + 1 + k
+                ruta[i:j + 1] = ruta[i:j + 1][::-1]
+                mejorado = True
+        if not mejorado:
+            break
+    return ruta.tolist()
+
+
+def optimizar_ruta(dist):
+    """
+    Orden de visita (índices de la matriz de distancias) que minimiza
+    el recorrido, empezando por el primer punto.
+    """
+    if len(dist) < 3:
+        return list(range(len(dist)))
+    return dos_opt(vecino_mas_cercano(dist), dist)
+
+
+def distancia_ruta(ruta, dist):
+    """Longitud (km) de un recorrido abierto."""
+    ruta = np.asarray(ruta)
+    return float(dist[ruta[:-1], ruta[1:]].sum())
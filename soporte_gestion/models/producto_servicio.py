@@ -47,43 +47,55 @@ class ProductTemplate(models.Model):
     ticket_count = fields.Integer(
         string='Número Tickets Asociados',
         compute='_compute_ticket_count',
+        store=True,
         help='Cantidad de tickets de incidencia que usan este producto'
     )
-    # Un campo calculado que muestra cuántos tickets están vinculados a este producto.
+    # Contador almacenado: el ORM solo lo recalcula para las plantillas cuyos
+    # productos cambian en algún ticket, así las vistas de productos no lo
+    # recalculan en cada carga.
 
     ticket_ids = fields.Many2many(
-        'ticket.incidencia',           # Modelo destino
-        'ticket_product_rel',          # Tabla intermedia
-        'template_id',                 # Columna que apunta al producto
-        'ticket_id',                   # Columna que apunta al ticket
+        'ticket.incidencia',
         string='Tickets de Incidencia relacionados',
+        compute='_compute_ticket_ids',
         readonly=True
     )
     # Relación M2M para navegar directamente desde el producto
-    # hasta los tickets que lo incluyen.
+    # hasta los tickets que lo incluyen (a través de sus variantes).
 
     # --- Lógica de negocio --- #
 
-    @api.depends('ticket_ids')
+    @api.depends('product_variant_ids.ticket_ids')
+    def _compute_ticket_ids(self):
+        """
+        Reúne los tickets de todas las variantes de la plantilla.
+        """
+        for tmpl in self:
+            tmpl.ticket_ids = tmpl.product_variant_ids.ticket_ids
+
+    @api.depends('product_variant_ids.ticket_ids')
     def _compute_ticket_count(self):
         """
-        Calcula el número de tickets asociados a cada plantilla de producto.
-        Agrupa por product_id usando read_group para eficiencia.
+        Calcula el número de tickets asociados a cada plantilla de producto
+        con una única agregación SQL sobre la tabla de relación de los tickets,
+        sea cual sea el número de plantillas.
         """
-        # Leemos en bloque el conteo de incidencias por producto
-        tickets = self.env['ticket.incidencia'].read_group(
-            [('product_ids', 'in', self.ids)],
-            ['product_ids'],
-            ['product_ids']
-        )
-        # Construimos un mapa {producto_id: cantidad}
         count_map = {}
-        for grp in tickets:
-            for prod_id in grp['product_ids']:
-                count_map[prod_id] = grp['__count']
+        template_ids = self._origin.ids
+        if template_ids:
+            # Volcamos a BD los cambios pendientes de product_ids antes de contar
+            self.env['ticket.incidencia'].flush_model(['product_ids'])
+            self.env.cr.execute("""
+                SELECT pp.product_tmpl_id, COUNT(DISTINCT rel.ticket_id)
+                  FROM ticket_producto_rel rel
+                  JOIN product_product pp ON pp.id = rel.product_id
+                 WHERE pp.product_tmpl_id IN %s
+                 GROUP BY pp.product_tmpl_id
+            """, [tuple(template_ids)])
+            count_map = dict(self.env.cr.fetchall())
         # Asignamos el conteo a cada registro
         for tmpl in self:
-            tmpl.ticket_count = count_map.get(tmpl.id, 0)
+            tmpl.ticket_count = count_map.get(tmpl._origin.id, 0)
 
     def action_view_tickets(self):
         """
@@ -92,8 +104,24 @@ class ProductTemplate(models.Model):
         """
         self.ensure_one()  # Solo funciona con un único producto seleccionado
         action = self.env.ref('soporte_gestion.action_ticket_incidencia').read()[0]
+        # Los tickets enlazan variantes (product.product), no plantillas
         action.update({
-            'domain': [('product_ids', 'in', [self.id])],
-            'context': {'default_product_ids': [(4, self.id)]},
+            'domain': [('product_ids', 'in', self.product_variant_ids.ids)],
+            'context': {'default_product_ids': [(4, self.product_variant_id.id)]},
         })
         return action
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    # Lado inverso de ticket.incidencia.product_ids, sobre la misma tabla
+    # de relación; permite que las plantillas dependan de sus tickets
+    ticket_ids = fields.Many2many(
+        'ticket.incidencia',           # Modelo destino
+        'ticket_producto_rel',         # Misma tabla intermedia que el ticket
+        'product_id',                  # Columna que apunta al producto
+        'ticket_id',                   # Columna que apunta al ticket
+        string='Tickets de Incidencia relacionados',
+        readonly=True
+    )
@@ -0,0 +1,52 @@
+from odoo import models, fields
+
+
+class ResCompany(models.Model):
+    # Extendemos la compañía con las opciones de funcionamiento del soporte
+    _inherit = 'res.company'
+
+    # Si está activo, guardar un ticket solo lo marca como pendiente de
+    # sincronizar y un cron reconcilia los eventos de calendario por lotes
+    soporte_calendario_diferido = fields.Boolean(
+        string='Sincronizar calendario en diferido',
+        default=False,
+        help='Los tickets no crean ni actualizan su evento de calendario al guardar; '
+             'una tarea programada los sincroniza por lotes poco después.'
+    )
+
+    # Historial compacto: las transiciones habituales se guardan solo como
+    # código fijo, sin copiar el texto en cada entrada
+    soporte_historial_compacto = fields.Boolean(
+        string='Historial compacto',
+        default=False,
+        help='Guarda las transiciones de los tickets como códigos de evento fijos '
+             'en lugar de notas de texto libre.'
+    )
+
+    # Recordatorios de renovación diferidos: al confirmar contratos no se
+    # crean actividades; un cron nocturno las crea al entrar en los 30 días
+    soporte_recordatorio_diferido = fields.Boolean(
+        string='Recordatorios de renovación diferidos',
+        default=False,
+        help='Las actividades de renovación se crean cada noche para los contratos '
+             'a los que les quedan 30 días o menos, en lugar de al confirmarlos.'
+    )
+
+    # Ventana de deduplicación: un aviso con la misma huella (cliente y
+    # equipo) que un ticket abierto se absorbe en él en lugar de crear otro
+    soporte_ventana_duplicados = fields.Integer(
+        string='Ventana de duplicados (minutos)',
+        default=0,
+        help='Los tickets nuevos del mismo cliente y equipo que un ticket abierto con '
+             'avisos en estos últimos minutos se añaden a su historial. 0 lo desactiva.'
+    )
+
+    # Chatter consolidado: las acciones de estado dejan una sola nota por
+    # ticket, sin seguimiento del campo ni entrada de historial duplicada
+    soporte_chatter_consolidado = fields.Boolean(
+        string='Chatter consolidado en transiciones',
+        default=False,
+        help='Iniciar, completar, cancelar y asignar dejan una única nota interna por '
+             'ticket (sin seguimiento del estado ni notificación a seguidores) y no '
+             'duplican la entrada de historial de la acción.'
+    )
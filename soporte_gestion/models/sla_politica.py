@@ -0,0 +1,42 @@
+from odoo import models, fields
+
+
+class SlaPolitica(models.Model):
+    _name = 'soporte.sla.politica'
+    _description = 'Política de SLA de Soporte'
+    _order = 'horas_resolucion, id'
+
+    # Nombre descriptivo de la política
+    name = fields.Char(
+        string='Nombre',
+        required=True
+    )
+    # Nivel de contrato al que se aplica (uno por periodicidad)
+    periodo = fields.Selection([
+        ('mensual', 'Mensual'),
+        ('trimestral', 'Trimestral'),
+        ('anual', 'Anual'),
+    ],
+        string='Periodicidad',
+        required=True,
+        help='Los contratos con esta periodicidad usan esta política.'
+    )
+    # Objetivos en horas laborables según el calendario de la compañía
+    horas_respuesta = fields.Float(
+        string='Horas de respuesta',
+        required=True,
+        help='Horas laborables para asignar el ticket desde su creación.'
+    )
+    horas_resolucion = fields.Float(
+        string='Horas de resolución',
+        required=True,
+        help='Horas laborables para completar el ticket desde su creación.'
+    )
+    active = fields.Boolean(
+        string='Activo',
+        default=True
+    )
+
+    _sql_constraints = [
+        ('periodo_unique', 'unique(periodo)', 'Solo puede haber una política de SLA por periodicidad.'),
+    ]
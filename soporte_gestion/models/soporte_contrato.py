@@ -1,6 +1,17 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
-from datetime import date, timedelta
+from datetime import timedelta
+from dateutil.relativedelta import relativedelta
+import threading
+
+from .instrumentacion import instrumentado
+
+# Duración de cada periodo de suscripción, usada al renovar
+DURACION_PERIODO = {
+    'mensual': relativedelta(months=1),
+    'trimestral': relativedelta(months=3),
+    'anual': relativedelta(years=1),
+}
 
 class SoporteContrato(models.Model):
     _name = 'soporte.contrato'
@@ -82,11 +93,88 @@ class SoporteContrato(models.Model):
         help='Permite inactivar la suscripción sin borrarla.'
     )
 
+    # Productos/servicios cubiertos por el contrato y descuento aplicado
+    # al facturarlos mientras el contrato esté activo (100 = sin coste)
+    product_ids = fields.Many2many(
+        'product.product',
+        'soporte_contrato_producto_rel',
+        'contrato_id', 'product_id',
+        string='Productos cubiertos',
+        tracking=True
+    )
+    descuento = fields.Float(
+        string='Descuento cobertura (%)',
+        default=100.0,
+        help='Descuento que se aplica en factura a los productos cubiertos.'
+    )
+
+    # Política de SLA según el nivel (periodicidad) del contrato
+    sla_politica_id = fields.Many2one(
+        'soporte.sla.politica',
+        string='Política SLA',
+        compute='_compute_sla_politica',
+        store=True,
+        readonly=False
+    )
+
+    # Renovación automática al expirar y enlace con el contrato renovado
+    renovacion_automatica = fields.Boolean(
+        string='Renovación automática',
+        default=False,
+        tracking=True,
+        help='Al expirar, se genera y activa un contrato sucesor por el mismo periodo.'
+    )
+    contrato_anterior_id = fields.Many2one(
+        'soporte.contrato',
+        string='Contrato anterior',
+        readonly=True,
+        copy=False
+    )
+
+    # Visitas preventivas recurrentes: cada cuánto (desde la fecha de inicio),
+    # qué técnico las hace, a qué hora local y cuánto duran
+    visita_recurrencia = fields.Selection([
+        ('mensual', 'Mensual'),
+        ('trimestral', 'Trimestral'),
+    ],
+        string='Visitas preventivas',
+        tracking=True,
+        help='Genera automáticamente una visita programada en cada periodo.'
+    )
+    visita_technician_id = fields.Many2one(
+        'res.users',
+        string='Técnico de las visitas',
+        tracking=True
+    )
+    visita_hora = fields.Float(
+        string='Hora de las visitas',
+        default=9.0
+    )
+    visita_duracion = fields.Float(
+        string='Duración de las visitas (horas)',
+        default=1.0
+    )
+
+    # Indica si ya se creó la actividad recordatoria de renovación
+    recordatorio_programado = fields.Boolean(
+        string='Recordatorio programado',
+        default=False,
+        copy=False,
+        readonly=True
+    )
+
     # Asegura que cada referencia sea única en base de datos
     _sql_constraints = [
         ('name_unique', 'unique(name)', 'La referencia debe ser única.')
     ]
 
+    def init(self):
+        # El cron de expiración filtra por estado y fecha de fin
+        tools.create_index(
+            self._cr, 'soporte_contrato_state_end_date_idx',
+            self._table, ['state', 'end_date']
+        )
+
     @api.onchange('periodo')
     def _onchange_periodo(self):
         """
@@ -99,6 +187,18 @@ class SoporteContrato(models.Model):
             mapping = {'mensual': 100.0, 'trimestral': 250.0, 'anual': 1000.0}
             self.amount = mapping.get(self.periodo, 0.0)
 
+    @api.depends('periodo')
+    def _compute_sla_politica(self):
+        """
+        Asigna la política de SLA de la periodicidad del contrato
+        (todas las políticas se leen en una sola consulta).
+        """
+        politicas = {
+            p.periodo: p for p in self.env['soporte.sla.politica'].search([])
+        }
+        for rec in self:
+            rec.sla_politica_id = politicas.get(rec.periodo, False)
+
     @api.constrains('start_date', 'end_date')
     def _check_dates(self):
         """
@@ -109,9 +209,23 @@ class SoporteContrato(models.Model):
         for rec in self:
             if rec.start_date > rec.end_date:
                 raise ValidationError(_('La fecha de inicio debe ser anterior a la fecha de fin.'))
-            if rec.end_date < date.today():
+            if rec.end_date < fields.Date.context_today(rec):
                 raise ValidationError(_('La fecha de fin no puede estar en el pasado.'))
 
+    @api.constrains('visita_recurrencia', 'visita_technician_id', 'visita_hora', 'visita_duracion')
+    def _check_visitas(self):
+        """
+        Las visitas recurrentes necesitan técnico, una hora del día válida y
+        una duración positiva.
+        """
+        for rec in self.filtered('visita_recurrencia'):
+            if not rec.visita_technician_id:
+                raise ValidationError(_('Indica el técnico que hará las visitas preventivas.'))
+            if not 0 <= rec.visita_hora < 24:
+                raise ValidationError(_('La hora de las visitas debe estar entre 0 y 24.'))
+            if rec.visita_duracion <= 0:
+                raise ValidationError(_('La duración de las visitas debe ser positiva.'))
+
     @api.depends('start_date', 'end_date')
     def _compute_duration(self):
         """
@@ -124,27 +238,111 @@ class SoporteContrato(models.Model):
             else:
                 rec.duration_days = 0
 
+    @api.model
+    def _get_coberturas(self, partner_ids, fecha):
+        """
+        Cobertura de contratos de varios clientes (entidades comerciales) en
+        una fecha: {commercial_partner_id: {product_id: descuento}} con los
+        productos cubiertos por algún contrato activo en esa fecha y el mayor
+        descuento aplicable. Una sola búsqueda para todo el lote, de modo que
+        los llamantes masivos (facturación) no necesitan caché entre
+        llamadas ni invalidarla cuando cambia un contrato.
+        """
+        coberturas = {partner_id: {} for partner_id in partner_ids}
+        if not partner_ids:
+            return coberturas
+        contratos = self.sudo().search([
+            ('partner_id.commercial_partner_id', 'in', list(partner_ids)),
+            ('state', '=', 'open'),
+            ('start_date', '<=', fecha),
+            ('end_date', '>=', fecha),
+        ])
+        for contrato in contratos:
+            cobertura = coberturas[contrato.partner_id.commercial_partner_id.id]
+            for product_id in contrato.product_ids.ids:
+                cobertura[product_id] = max(cobertura.get(product_id, 0.0), contrato.descuento)
+        return coberturas
+
+    @api.model
+    def _get_politicas_sla(self, partner_ids, fecha):
+        """
+        Política de SLA aplicable a cada cliente (entidad comercial) en una
+        fecha: {commercial_partner_id: política}. Si un cliente tiene varios
+        contratos activos se queda con la política más exigente.
+        Una sola búsqueda para todos los clientes del lote.
+        """
+        if not partner_ids:
+            return {}
+        contratos = self.sudo().search([
+            ('partner_id.commercial_partner_id', 'in', list(partner_ids)),
+            ('state', '=', 'open'),
+            ('start_date', '<=', fecha),
+            ('end_date', '>=', fecha),
+            ('sla_politica_id', '!=', False),
+        ])
+        politicas = {}
+        for contrato in contratos:
+            partner_id = contrato.partner_id.commercial_partner_id.id
+            politica = contrato.sla_politica_id
+            actual = politicas.get(partner_id)
+            if not actual or politica.horas_resolucion < actual.horas_resolucion:
+                politicas[partner_id] = politica
+        return politicas
+
+    @instrumentado
     def action_confirm(self):
         """
         Al confirmar el contrato:
         - Cambia el estado a 'Activo'.
         - Reactiva el contrato.
-        - Crea una actividad recordatoria 30 días antes del fin para renovar.
+        - Crea una actividad recordatoria 30 días antes del fin para renovar,
+          o la deja para el cron nocturno si la compañía difiere los recordatorios.
+        Todo se hace con una sola escritura y un único create de actividades.
         """
-        for rec in self:
-            rec.state = 'open'
-            rec.active = True
-            if rec.end_date:
-                reminder = rec.end_date - timedelta(days=30)
-                self.env['mail.activity'].create({
-                    'res_model_id': self.env['ir.model']._get_id('soporte.contrato'),
-                    'res_id': rec.id,
-                    'activity_type_id': self.env.ref('mail.mail_activity_data_todo').id,
-                    'summary': _('Renovar contrato %s') % rec.name,
-                    'date_deadline': reminder,
-                    'user_id': self.env.user.id,
-                })
+        self.write({'state': 'open', 'active': True})
+        if not self.env.company.soporte_recordatorio_diferido:
+            self.filtered('end_date')._crear_recordatorios(self.env.user)
 
+    def _crear_recordatorios(self, user=None):
+        """
+        Crea en bloque las actividades de renovación de los contratos y los
+        marca como programados. Si no se indica usuario, la actividad se
+        asigna a quien creó el contrato.
+        """
+        contratos = self.filtered(lambda r: not r.recordatorio_programado)
+        if not contratos:
+            return self.env['mail.activity']
+        # Constantes resueltas una sola vez para todo el lote
+        res_model_id = self.env['ir.model']._get_id('soporte.contrato')
+        activity_type_id = self.env.ref('mail.mail_activity_data_todo').id
+        activities = self.env['mail.activity'].create([{
+            'res_model_id': res_model_id,
+            'res_id': rec.id,
+            'activity_type_id': activity_type_id,
+            'summary': _('Renovar contrato %s') % rec.name,
+            'date_deadline': rec.end_date - timedelta(days=30),
+            'user_id': user.id if user else rec.create_uid.id,
+        } for rec in contratos])
+        contratos.write({'recordatorio_programado': True})
+        return activities
+
+    @api.model
+    @instrumentado
+    def _cron_programar_recordatorios(self):
+        """
+        Tarea programada (cron) nocturna para el modo de recordatorios diferidos:
+        crea las actividades de renovación solo de los contratos activos que
+        entran en la ventana de 30 días previa a su fin.
+        """
+        limite = fields.Date.context_today(self) + timedelta(days=30)
+        contratos = self.search([
+            ('state', '=', 'open'),
+            ('recordatorio_programado', '=', False),
+            ('end_date', '<=', limite),
+        ])
+        contratos._crear_recordatorios()
+
+    @instrumentado
     def action_cancel(self):
         """
         Cancela el contrato:
@@ -154,12 +352,151 @@ class SoporteContrato(models.Model):
         self.write({'state': 'cancel', 'active': False})
 
     @api.model
-    def _cron_expirar_contratos(self):
+    @instrumentado
+    def _cron_expirar_contratos(self, batch_size=None):
         """
         Tarea programada (cron) que:
-        - Busca contratos activos cuyo fin ya pasó.
+        - Busca contratos activos cuyo fin ya pasó (según la fecha local).
         - Marca su estado como 'Expirado' e inactiva el registro.
+        - Genera los sucesores de los que tengan renovación automática.
+        Trabaja por lotes confirmados uno a uno: cada lote sale de la búsqueda
+        al expirar, así que si se interrumpe retoma donde lo dejó.
+        """
+        hoy = fields.Date.context_today(self)
+        if not batch_size:
+            batch_size = int(self.env['ir.config_parameter'].sudo().get_param(
+                'soporte_gestion.contratos_lote', 1000))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        while True:
+            expirar = self.search(
+                [('state', '=', 'open'), ('end_date', '<', hoy)],
+                order='end_date, id', limit=batch_size,
+            )
+            if not expirar:
+                break
+            expirar.write({'state': 'expired', 'active': False})
+            expirar.filtered('renovacion_automatica')._renovar()
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    @instrumentado
+    def _renovar(self):
+        """
+        Genera y activa en bloque (un único create) los contratos sucesores:
+        mismo cliente, periodo, importe y cobertura, empezando al día siguiente
+        del fin. Si el contrato expiró hace varios periodos, el sucesor se
+        encadena hasta cubrir la fecha actual.
+        """
+        if not self:
+            return self
+        hoy = fields.Date.context_today(self)
+        vals_list = []
+        for rec in self:
+            duracion = DURACION_PERIODO[rec.periodo]
+            start = rec.end_date + timedelta(days=1)
+            end = start + duracion - timedelta(days=1)
+            while end < hoy:
+                start = end + timedelta(days=1)
+                end = start + duracion - timedelta(days=1)
+            vals_list.append({
+                'partner_id': rec.partner_id.id,
+                'periodo': rec.periodo,
+                'start_date': start,
+                'end_date': end,
+                'amount': rec.amount,
+                'currency_id': rec.currency_id.id,
+                'product_ids': [(6, 0, rec.product_ids.ids)],
+                'descuento': rec.descuento,
+                'renovacion_automatica': True,
+                'contrato_anterior_id': rec.id,
+                'visita_recurrencia': rec.visita_recurrencia,
+                'visita_technician_id': rec.visita_technician_id.id,
+                'visita_hora': rec.visita_hora,
+                'visita_duracion': rec.visita_duracion,
+            })
+        sucesores = self.create(vals_list)
+        sucesores.action_confirm()
+        return sucesores
+
+    @api.model
+    @instrumentado
+    def _cron_generar_visitas(self, horizonte=None, batch_size=None):
+        """
+        Tarea programada (cron) que genera las visitas preventivas de los
+        contratos activos con recurrencia para los próximos días:
+        - Calcula en memoria las ocurrencias de cada contrato (desde su fecha
+          de inicio, cada mes o trimestre) dentro del horizonte y la vigencia.
+        - Descarta las que ya tienen visita con una sola consulta sobre el
+          índice único (contrato, ocurrencia), y las de hoy cuya hora ya ha
+          pasado: una visita programada en el pasado no se podría confirmar.
+        - Crea las visitas ya programadas con create(vals_list) por lotes
+          confirmados uno a uno; cada lote crea de una vez sus eventos de
+          calendario y marca los solapes en lugar de detener la generación.
+        Si se interrumpe, la siguiente ejecución solo crea las que faltan.
         """
-        hoy = date.today()
-        expirar = self.search([('state', '=', 'open'), ('end_date', '<', hoy)])
-        expirar.write({'state': 'expired', 'active': False})
+        params = self.env['ir.config_parameter'].sudo()
+        if not horizonte:
+            horizonte = int(params.get_param('soporte_gestion.visitas_horizonte_dias', 92))
+        if not batch_size:
+            batch_size = int(params.get_param('soporte_gestion.visitas_lote', 1000))
+        hoy = fields.Date.context_today(self)
+        ahora = fields.Datetime.now()
+        limite = hoy + timedelta(days=horizonte)
+        contratos = self.search([
+            ('state', '=', 'open'),
+            ('visita_recurrencia', '!=', False),
+            ('visita_technician_id', '!=', False),
+            ('start_date', '<=', limite),
+            ('end_date', '>=', hoy),
+        ])
+        if not contratos:
+            return
+
+        Cita = self.env['cita.visita.soporte']
+        Cita.flush_model(['contrato_id', 'recurrencia_fecha'])
+        self.env.cr.execute("""
+            SELECT contrato_id, recurrencia_fecha
+              FROM cita_visita_soporte
+             WHERE contrato_id = ANY(%s)
+               AND recurrencia_fecha BETWEEN %s AND %s
+        """, [contratos.ids, hoy, limite])
+        existentes = set(self.env.cr.fetchall())
+
+        # Inicio UTC de cada día local, compartido por todos los contratos
+        inicios = {}
+        vals_list = []
+        for rec in contratos:
+            paso = DURACION_PERIODO[rec.visita_recurrencia]
+            fin = min(limite, rec.end_date)
+            n = 0
+            fecha = rec.start_date
+            while fecha <= fin:
+                if fecha >= hoy and (rec.id, fecha) not in existentes:
+                    if fecha not in inicios:
+                        inicios[fecha] = Cita._limites_dia_utc(fecha)[0]
+                    inicio = inicios[fecha] + timedelta(hours=rec.visita_hora)
+                    # La de hoy, si su hora ya ha pasado, nacería en el pasado
+                    if inicio >= ahora:
+                        vals_list.append({
+                            'contrato_id': rec.id,
+                            'recurrencia_fecha': fecha,
+                            'technician_id': rec.visita_technician_id.id,
+                            'date': inicio,
+                            'duracion': rec.visita_duracion,
+                            'state': 'scheduled',
+                            'description': _('Visita preventiva del contrato %s') % rec.name,
+                        })
+                n += 1
+                fecha = rec.start_date + paso * n
+
+        Cita = Cita.with_context(
+            soporte_marcar_solapes=True, tracking_disable=True,
+            mail_create_nolog=True, mail_create_nosubscribe=True,
+        )
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        for i in range(0, len(vals_list), batch_size):
+            Cita.create(vals_list[i:i + batch_size])
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
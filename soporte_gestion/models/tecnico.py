@@ -1,6 +1,8 @@
 # models/tecnico.py
 
-from odoo import models, fields
+from datetime import timedelta
+
+from odoo import models, fields, api
 
 class Tecnico(models.Model):
     _name = 'soporte.tecnico'
@@ -50,3 +52,118 @@ class HrEmployee(models.Model):
         readonly=True,
         help='Incidencias de soporte donde este empleado actúa como técnico'
     )
+
+    # Solo los técnicos de soporte entran en la asignación automática
+    soporte_tecnico = fields.Boolean(
+        string='Técnico de soporte',
+        index=True,
+        help='Puede recibir tickets en la asignación automática'
+    )
+
+    # Instantánea de carga de trabajo, recalculada por cron; los cambios de
+    # tickets y citas adelantan su ejecución en lugar de recalcularla al guardar.
+    # Hasta que el cron corre puede ir por detrás: la asignación automática
+    # cuenta en vivo los tickets abiertos y solo toma de aquí visitas y horas
+    carga_tickets_abiertos = fields.Integer(
+        string='Tickets abiertos',
+        readonly=True,
+        help='Tickets en borrador, asignados o en progreso del técnico'
+    )
+    carga_visitas_proximas = fields.Integer(
+        string='Visitas próximas',
+        readonly=True,
+        help='Citas programadas en los próximos días (parámetro soporte_gestion.carga_dias)'
+    )
+    carga_horas_ocupadas = fields.Float(
+        string='Horas ocupadas',
+        readonly=True,
+        help='Horas de calendario ocupadas en los próximos días'
+    )
+
+    def _actualizar_carga_trabajo(self):
+        """
+        Recalcula la carga de trabajo de los empleados con una sola sentencia
+        UPDATE que agrega tickets abiertos, citas programadas y horas de
+        calendario de los próximos días.
+        """
+        if not self:
+            return
+        dias = int(self.env['ir.config_parameter'].sudo().get_param('soporte_gestion.carga_dias', 7))
+        desde = fields.Datetime.now()
+        hasta = desde + timedelta(days=dias)
+        # Volcamos a BD los cambios pendientes antes de agregar en SQL
+        self.env['ticket.incidencia'].flush_model(['technician_id', 'state'])
+        self.env['cita.visita.soporte'].flush_model(['technician_id', 'state', 'date'])
+        self.env['calendar.event'].flush_model(['user_id', 'start', 'duration', 'active'])
+        self.flush_recordset(['user_id'])
+        self.env.cr.execute("""
+            UPDATE hr_employee AS e
+               SET carga_tickets_abiertos = COALESCE(t.n, 0),
+                   carga_visitas_proximas = COALESCE(v.n, 0),
+                   carga_horas_ocupadas = COALESCE(c.horas, 0)
+              FROM hr_employee AS emp
+              LEFT JOIN (
+                    SELECT technician_id, COUNT(*) AS n
+                      FROM ticket_incidencia
+                     WHERE state IN ('draft', 'assigned', 'in_progress')
+                       AND technician_id IN %(ids)s
+                     GROUP BY technician_id
+              ) AS t ON t.technician_id = emp.id
+              LEFT JOIN (
+                    SELECT technician_id, COUNT(*) AS n
+                      FROM cita_visita_soporte
+                     WHERE state = 'scheduled'
+                       AND date >= %(desde)s AND date < %(hasta)s
+                     GROUP BY technician_id
+              ) AS v ON v.technician_id = emp.user_id
+              LEFT JOIN (
+                    SELECT user_id, SUM(duration) AS horas
+                      FROM calendar_event
+                     WHERE active
+                       AND start >= %(desde)s AND start < %(hasta)s
+                     GROUP BY user_id
+              ) AS c ON c.user_id = emp.user_id
+             WHERE e.id = emp.id
+               AND e.id IN %(ids)s
+        """, {'ids': tuple(self.ids), 'desde': desde, 'hasta': hasta})
+        self.invalidate_recordset([
+            'carga_tickets_abiertos', 'carga_visitas_proximas', 'carga_horas_ocupadas',
+        ])
+
+    @api.model
+    def _programar_carga_trabajo(self):
+        """
+        Adelanta el cron de carga de trabajo. Los guardados de tickets y
+        citas lo llaman en lugar de recalcular la carga en su transacción:
+        el UPDATE agregado sobre hr_employee bloquearía las filas de los
+        técnicos en cada cambio de estado y serializaría a quienes trabajan
+        con tickets del mismo técnico.
+        """
+        cron = self.env.ref('soporte_gestion.ir_cron_actualizar_carga_trabajo', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _cron_actualizar_carga_trabajo(self):
+        """
+        Tarea programada (cron) que refresca la carga de todos los técnicos
+        de soporte: a diario, porque las visitas y horas dependen del paso
+        del tiempo, y cada vez que un cambio de tickets o citas la adelanta.
+        """
+        self.search([('soporte_tecnico', '=', True), ('user_id', '!=', False)])._actualizar_carga_trabajo()
+
+    @api.model
+    def _candidatos_asignacion(self):
+        """
+        Técnicos elegibles para la asignación automática (técnicos de
+        soporte activos, con usuario y de la compañía actual), ordenados de
+        menor a mayor carga en una sola consulta.
+        """
+        return self.search(
+            [
+                ('soporte_tecnico', '=', True),
+                ('user_id', '!=', False),
+                ('company_id', '=', self.env.company.id),
+            ],
+            order='carga_tickets_abiertos, carga_visitas_proximas, carga_horas_ocupadas, id',
+        )
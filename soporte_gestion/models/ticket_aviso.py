@@ -0,0 +1,40 @@
+from odoo import models, fields
+
+
+class TicketAviso(models.Model):
+    """
+    Referencias externas de los avisos absorbidos por un ticket abierto.
+    El ticket solo guarda la referencia del aviso que lo creó; las de los
+    avisos duplicados se guardan aquí para que la API de alta reconozca sus
+    reintentos y no los vuelva a absorber.
+    """
+    _name = 'soporte.ticket.aviso'
+    _description = 'Aviso absorbido por un ticket'
+    _order = 'fecha desc, id desc'
+    _rec_name = 'external_ref'
+    # Registro de solo inserción: la fecha ya dice cuándo llegó el aviso
+    _log_access = False
+
+    # Ticket que absorbió el aviso
+    incidencia_id = fields.Many2one(
+        'ticket.incidencia',
+        string='Incidencia',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    # Referencia del sistema de origen del aviso
+    external_ref = fields.Char(
+        string='Referencia externa',
+        required=True,
+        readonly=True
+    )
+    fecha = fields.Datetime(
+        string='Fecha',
+        default=fields.Datetime.now,
+        readonly=True
+    )
+
+    _sql_constraints = [
+        ('external_ref_unique', 'unique(external_ref)', 'Ese aviso ya se ha registrado.'),
+    ]
@@ -1,8 +1,36 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+
+# Códigos fijos de evento del historial. En modo compacto solo se guarda
+# el código y el texto se obtiene de aquí al mostrarlo.
+CODIGOS_HISTORIAL = [
+    ('creada', 'Incidencia creada'),
+    ('estado_draft', 'Estado cambiado a Borrador'),
+    ('estado_assigned', 'Estado cambiado a Asignado'),
+    ('estado_in_progress', 'Estado cambiado a En Progreso'),
+    ('estado_done', 'Estado cambiado a Completado'),
+    ('estado_cancelled', 'Estado cambiado a Cancelado'),
+    ('iniciada', 'Trabajo en progreso iniciado'),
+    ('completada', 'Trabajo completado'),
+    ('cancelada', 'Ticket cancelado'),
+    ('asignada_manual', "Estado cambiado manualmente a 'Asignado'"),
+    ('sla_respuesta', 'SLA: Respuesta incumplida'),
+    ('sla_resolucion', 'SLA: Resolución incumplida'),
+    ('aviso_absorbido', 'Aviso duplicado recibido'),
+    ('fusionada', 'Tickets duplicados fusionados'),
+]
+
+# Vector de búsqueda de texto completo de las notas; las búsquedas deben
+# usar exactamente esta expresión para aprovechar su índice GIN
+TSV_HISTORIAL = "to_tsvector('spanish', coalesce(notes, ''))"
+
 
 class TicketHistorial(models.Model):
     _name = 'ticket.historial'
     _description = 'Historial de Incidencias'
+    _order = 'date desc, id desc'
+    # Registro de solo inserción: user_id y date ya guardan autor y momento,
+    # así que prescindimos de create_uid/create_date/write_uid/write_date
+    _log_access = False
 
     # Enlaza cada registro de historial con su incidencia (ticket)
     incidencia_id = fields.Many2one(
@@ -27,17 +55,56 @@ class TicketHistorial(models.Model):
         readonly=True,
     )
 
+    # Código fijo del evento (transiciones y acciones habituales)
+    code = fields.Selection(
+        CODIGOS_HISTORIAL,
+        string='Evento',
+        readonly=True,
+    )
+
     # Detalle o nota que se quiere dejar en el historial
+    # (vacío en modo compacto cuando el código ya describe el evento)
     notes = fields.Text(
         string='Notas',
-        required=True,       # Obligatorio para no tener entradas vacías
     )
 
-    @api.model
-    def create(self, vals):
+    # Texto a mostrar: la nota libre o, si no la hay, la etiqueta del código
+    resumen = fields.Char(
+        string='Detalle',
+        compute='_compute_resumen',
+    )
+
+    # Ninguna entrada puede quedar vacía
+    _sql_constraints = [
+        ('code_or_notes', 'CHECK(code IS NOT NULL OR notes IS NOT NULL)',
+         'Cada entrada del historial necesita un código o una nota.'),
+    ]
+
+    def init(self):
+        # La pestaña de historial del ticket filtra por incidencia y ordena por fecha
+        tools.create_index(
+            self._cr, 'ticket_historial_incidencia_date_idx',
+            self._table, ['incidencia_id', 'date DESC']
+        )
+        # Búsqueda de texto completo en las notas
+        tools.create_index(
+            self._cr, 'ticket_historial_notes_tsv_idx',
+            self._table, [TSV_HISTORIAL], method='gin'
+        )
+
+    @api.depends('code', 'notes')
+    def _compute_resumen(self):
+        labels = dict(self._fields['code'].selection)
+        for rec in self:
+            rec.resumen = rec.notes or labels.get(rec.code, '')
+
+    @api.model_create_multi
+    def create(self, vals_list):
         """
         Asegura que, si no se pasa explícitamente user_id,
         se utilice siempre el usuario actual como autor de la nota.
+        Admite la creación de varias entradas en una sola llamada.
         """
-        vals.setdefault('user_id', self.env.user.id)
-        return super().create(vals)
+        for vals in vals_list:
+            vals.setdefault('user_id', self.env.user.id)
+        return super().create(vals_list)
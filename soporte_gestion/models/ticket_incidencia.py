@@ -1,12 +1,34 @@
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError, ValidationError
+from collections import defaultdict
 import datetime
+import heapq
+import threading
+import unicodedata
+
+from markupsafe import Markup
+
+from .kpi_diario import EVENTO_ESTADO
+from .instrumentacion import instrumentado
+from .ticket_historial import TSV_HISTORIAL
+
+# Estados en los que un ticket sigue abierto
+ESTADOS_ABIERTOS = ('draft', 'assigned', 'in_progress')
+
+# Vector de búsqueda de texto completo del ticket (descripción y equipo),
+# almacenado en la columna generada texto_tsv con su índice GIN
+TSV_TICKET = "to_tsvector('spanish', coalesce(descripcion, '') || ' ' || coalesce(equipo_afectado, ''))"
+# Términos del propio ticket que se usan para buscar tickets similares
+MAX_TERMINOS_SIMILARES = 10
+# Candidatos (los más recientes que casan) que se puntúan con ts_rank
+MAX_CANDIDATOS_SIMILARES = 200
 
 class TicketIncidencia(models.Model):
     _name = 'ticket.incidencia'
     _description = 'Ticket de Incidencia'
-    _inherit = ['mail.thread', 'mail.activity.mixin']  # Habilita chatter y actividades
-    _order = 'name desc'  # Ordena los tickets por referencia, de mayor a menor
+    # Habilita chatter, actividades y la sincronización de calendario por lotes
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'soporte.calendar.mixin']
+    _order = 'id desc'  # Los más recientes primero; id está indexado y la referencia no
 
     # Referencia única autogenerada (secuencia)
     name = fields.Char(
@@ -22,7 +44,8 @@ class TicketIncidencia(models.Model):
         'res.partner', 'Cliente',
         required=True,
         tracking=True,
-        ondelete='cascade'
+        ondelete='cascade',
+        index=True
     )
     # Usuario que creó el ticket
     user_id = fields.Many2one(
@@ -34,7 +57,8 @@ class TicketIncidencia(models.Model):
     technician_id = fields.Many2one(
         'hr.employee', 'Técnico asignado',
         required=True,
-        tracking=True
+        tracking=True,
+        index=True
     )
     # Eventos de calendario asociados (se sincronizan con cambios de estado)
     event_id = fields.Many2one(
@@ -58,20 +82,50 @@ class TicketIncidencia(models.Model):
     descripcion = fields.Text('Descripción', help='Detalles del problema')
     equipo_afectado = fields.Char('Equipo Afectado', help='Dispositivo o sistema')
 
-    # Foto y sus versiones redimensionadas
+    # Foto y sus versiones redimensionadas: cada variante se guarda ya
+    # reducida, de modo que kanban y listas solo descargan la miniatura
     image = fields.Image("Foto de Incidencia", max_width=1024, max_height=1024)
-    image_medium = fields.Image("Imagen mediana", related="image", store=True, readonly=True)
-    image_small = fields.Image("Imagen", related="image", store=True, readonly=True)
+    image_medium = fields.Image(
+        "Imagen mediana", related="image",
+        max_width=512, max_height=512,
+        store=True, readonly=True
+    )
+    image_small = fields.Image(
+        "Imagen", related="image",
+        max_width=128, max_height=128,
+        store=True, readonly=True
+    )
 
     # Fechas de inicio y finalización del trabajo, calculadas al cambiar estado
-    event_start = fields.Datetime('Fecha de Inicio', readonly=True)
-    event_stop = fields.Datetime('Fecha de Finalización', readonly=True)
+    # (índices para el rango de fechas de la vista de calendario; los tickets
+    # sin fecha no entran en él, así que se excluyen del índice)
+    event_start = fields.Datetime('Fecha de Inicio', readonly=True, index='btree_not_null')
+    event_stop = fields.Datetime('Fecha de Finalización', readonly=True, index='btree_not_null')
 
     # Historial de acciones y notas (modelo separado)
     historial_ids = fields.One2many(
         'ticket.historial', 'incidencia_id',
         'Historial', readonly=True
     )
+    # Número de entradas de historial; el formulario abre el historial
+    # paginado bajo demanda en lugar de cargarlo entero
+    historial_count = fields.Integer(
+        'Entradas de historial',
+        compute='_compute_historial_count'
+    )
+    # Búsqueda de texto completo en descripción, equipo y notas del historial
+    texto_busqueda = fields.Char(
+        'Texto',
+        compute='_compute_texto_busqueda',
+        search='_search_texto_busqueda'
+    )
+    # Tickets resueltos con descripción parecida, del más al menos similar;
+    # el formulario no lo muestra, los abre bajo demanda action_view_similares
+    similares_ids = fields.Many2many(
+        'ticket.incidencia',
+        string='Tickets similares',
+        compute='_compute_similares'
+    )
     # Productos o servicios vinculados al ticket
     product_ids = fields.Many2many(
         'product.product',
@@ -80,116 +134,749 @@ class TicketIncidencia(models.Model):
         'Productos/Servicios',
         tracking=True
     )
+    # Factura en la que se ha facturado el ticket
+    invoice_id = fields.Many2one(
+        'account.move', 'Factura',
+        readonly=True,
+        copy=False,
+        index='btree_not_null'
+    )
+    # Referencia del sistema de origen (p. ej. la alerta de monitorización);
+    # hace de clave de idempotencia para la API de alta de tickets
+    external_ref = fields.Char(
+        'Referencia externa',
+        copy=False,
+        readonly=True
+    )
+    # Huella de duplicados: cliente + equipo normalizado. Los avisos con la
+    # misma huella dentro de la ventana de la compañía se absorben
+    huella = fields.Char(
+        'Huella',
+        compute='_compute_huella',
+        store=True,
+        copy=False
+    )
+    # Momento del último aviso recibido (creación o aviso absorbido)
+    ultimo_aviso = fields.Datetime(
+        'Último aviso',
+        default=fields.Datetime.now,
+        readonly=True,
+        copy=False
+    )
+    # Número de avisos que ha recibido el ticket, incluido el original
+    avisos_count = fields.Integer(
+        'Avisos',
+        default=1,
+        readonly=True,
+        copy=False
+    )
+    # Ticket en el que se fusionó este duplicado
+    fusionado_en_id = fields.Many2one(
+        'ticket.incidencia', 'Fusionado en',
+        readonly=True,
+        copy=False
+    )
+    # Marca de evento de calendario pendiente de sincronizar (modo diferido)
+    calendar_dirty = fields.Boolean(
+        'Calendario pendiente',
+        default=False,
+        copy=False,
+        readonly=True
+    )
+
+    # SLA: política del contrato del cliente y plazos ya calculados en horas
+    # laborables, guardados para que listas y kanban no los recalculen
+    sla_politica_id = fields.Many2one(
+        'soporte.sla.politica', 'Política SLA',
+        readonly=True,
+        copy=False
+    )
+    sla_deadline_respuesta = fields.Datetime(
+        'Límite de respuesta',
+        readonly=True,
+        copy=False
+    )
+    sla_deadline = fields.Datetime(
+        'Límite de resolución',
+        readonly=True,
+        copy=False
+    )
+    # Nivel de escalado alcanzado por incumplimiento del SLA
+    sla_escalado = fields.Selection([
+        ('respuesta', 'Respuesta incumplida'),
+        ('resolucion', 'Resolución incumplida'),
+    ],
+        string='Escalado SLA',
+        readonly=True,
+        copy=False,
+        tracking=True
+    )
+
+    _sql_constraints = [
+        ('external_ref_unique', 'unique(external_ref)', 'Ya existe un ticket con esa referencia externa.'),
+    ]
+
+    # Campos del ticket que se reflejan en el evento de calendario; si una
+    # escritura no toca ninguno de ellos no hace falta resincronizar
+    _CAMPOS_EVENTO = (
+        'name', 'state', 'partner_id', 'technician_id',
+        'descripcion', 'equipo_afectado', 'event_start', 'event_stop',
+    )
+
+    def init(self):
+        # Columnas del kanban (agrupado por estado) en el orden por defecto
+        tools.create_index(
+            self._cr, 'ticket_incidencia_state_id_idx',
+            self._table, ['state', 'id DESC']
+        )
+        # Carga de trabajo y autoasignación: tickets abiertos por técnico
+        tools.create_index(
+            self._cr, 'ticket_incidencia_tecnico_abiertos_idx',
+            self._table, ['technician_id', 'state'],
+            where="state IN ('draft', 'assigned', 'in_progress')"
+        )
+        # Búsqueda de duplicados al crear: huella de tickets abiertos por fecha
+        tools.create_index(
+            self._cr, 'ticket_incidencia_huella_idx',
+            self._table, ['huella', 'ultimo_aviso DESC'],
+            where="state IN ('draft', 'assigned', 'in_progress')"
+        )
+        # Índice parcial: el cron solo recorre los tickets pendientes
+        tools.create_index(
+            self._cr, 'ticket_incidencia_calendar_dirty_idx',
+            self._table, ['id'], where='calendar_dirty'
+        )
+        # Búsqueda de texto completo en descripción y equipo: el vector se
+        # guarda en una columna generada por PostgreSQL (fuera del ORM, que
+        # nunca la escribe), así el índice GIN y el ranking de similares lo
+        # leen en lugar de recalcular to_tsvector en cada fila candidata
+        self._cr.execute(f"""
+            ALTER TABLE ticket_incidencia
+              ADD COLUMN IF NOT EXISTS texto_tsv tsvector
+                  GENERATED ALWAYS AS ({TSV_TICKET}) STORED
+        """)
+        self._cr.execute("DROP INDEX IF EXISTS ticket_incidencia_texto_tsv_idx")
+        tools.create_index(
+            self._cr, 'ticket_incidencia_texto_vector_idx',
+            self._table, ['texto_tsv'], method='gin'
+        )
+        # Índices parciales del cron de SLA: solo contienen los tickets que
+        # aún pueden incumplir, así la búsqueda crece con los incumplimientos
+        tools.create_index(
+            self._cr, 'ticket_incidencia_sla_respuesta_idx',
+            self._table, ['sla_deadline_respuesta'],
+            where="state = 'draft' AND sla_escalado IS NULL"
+        )
+        tools.create_index(
+            self._cr, 'ticket_incidencia_sla_resolucion_idx',
+            self._table, ['sla_deadline'],
+            where="state IN ('draft', 'assigned', 'in_progress')"
+                  " AND (sla_escalado IS NULL OR sla_escalado = 'respuesta')"
+        )
 
     @api.model_create_multi
+    @instrumentado
     def create(self, vals_list):
         """
         Al crear uno o varios tickets:
-        - Si el estado es 'assigned', fija event_start ahora.
-        - Sincroniza/crea el evento de calendario.
-        - Añade una entrada inicial en el historial.
+        - Si el estado es 'assigned', fija event_start ahora (en los propios vals,
+          sin escritura adicional).
+        - Fija la política SLA y sus plazos según el contrato del cliente,
+          también en los propios vals.
+        - Reserva de una vez las referencias de la secuencia para todo el lote.
+        - Si la compañía tiene ventana de duplicados, los avisos con la huella
+          de un ticket abierto se añaden a su historial en lugar de crear otro
+          ticket; en su posición se devuelve el ticket que los absorbe.
+        - Sincroniza/crea los eventos de calendario de todo el lote.
+        - Añade una entrada inicial en el historial con un único create.
         """
+        now = fields.Datetime.now()
+        ventana = self.env.company.soporte_ventana_duplicados
+        if ventana and not self.env.context.get('soporte_sin_absorber'):
+            return self._crear_absorbiendo(vals_list, now - datetime.timedelta(minutes=ventana))
+        for vals in vals_list:
+            if vals.get('state') == 'assigned':
+                vals.setdefault('event_start', now)
+        sin_nombre = [vals for vals in vals_list if not vals.get('name')]
+        for vals, name in zip(sin_nombre, self._reservar_referencias(len(sin_nombre))):
+            vals['name'] = name
+        partners = self.env['res.partner'].browse({
+            vals['partner_id'] for vals in vals_list if vals.get('partner_id')
+        })
+        sla = self._valores_sla(partners, now)
+        for vals in vals_list:
+            for fname, value in sla.get(vals.get('partner_id'), {}).items():
+                vals.setdefault(fname, value)
         records = super().create(vals_list)
-        for rec in records:
-            if rec.state == 'assigned':
-                rec.event_start = fields.Datetime.now()
-            rec._sync_event()
-            rec.create_historial_entry("Incidencia creada")
+        records._sync_event()
+        records.create_historial_entry("Incidencia creada", code='creada')
+        self.env['soporte.kpi.diario']._sumar('creado', records)
+        if records.technician_id:
+            self.env['hr.employee']._programar_carga_trabajo()
         return records
 
+    @api.depends('partner_id', 'equipo_afectado')
+    def _compute_huella(self):
+        for rec in self:
+            rec.huella = self._calcular_huella(rec.partner_id.id, rec.equipo_afectado)
+
+    @api.model
+    def _calcular_huella(self, partner_id, equipo):
+        """
+        Huella de un aviso: cliente y equipo sin mayúsculas, acentos ni
+        espacios repetidos. Sin equipo no hay huella (no se deduplica).
+        """
+        if not partner_id or not equipo:
+            return False
+        equipo = unicodedata.normalize('NFKD', equipo)
+        equipo = ''.join(c for c in equipo if not unicodedata.combining(c))
+        return f"{partner_id}:{' '.join(equipo.lower().split())}"
+
+    @api.model
+    def _crear_absorbiendo(self, vals_list, desde):
+        """
+        Crea los tickets de vals_list salvo los que repiten la huella de un
+        ticket abierto con avisos desde 'desde' (o de otro aviso anterior del
+        mismo lote): esos se registran como avisos del ticket existente.
+        Una búsqueda para todo el lote, un create para los nuevos y una sola
+        actualización y un create de historial para los absorbidos.
+        """
+        huellas = [
+            self._calcular_huella(vals.get('partner_id'), vals.get('equipo_afectado'))
+            for vals in vals_list
+        ]
+        abiertos = {}
+        for ticket in self.search([
+            ('huella', 'in', [h for h in huellas if h]),
+            ('state', 'in', ESTADOS_ABIERTOS),
+            ('ultimo_aviso', '>=', desde),
+        ], order='ultimo_aviso desc'):
+            abiertos.setdefault(ticket.huella, ticket)
+
+        nuevos_vals = []
+        destino_nuevo = {}  # huella -> índice en nuevos_vals
+        posiciones = []     # por entrada: ticket existente o índice del nuevo
+        for vals, huella in zip(vals_list, huellas):
+            if huella and huella in abiertos:
+                posiciones.append(abiertos[huella])
+            elif huella and huella in destino_nuevo:
+                posiciones.append(destino_nuevo[huella])
+            else:
+                if huella:
+                    destino_nuevo[huella] = len(nuevos_vals)
+                posiciones.append(len(nuevos_vals))
+                nuevos_vals.append(vals)
+
+        creados = self.with_context(soporte_sin_absorber=True).create(nuevos_vals)
+        tickets = [
+            creados[pos] if isinstance(pos, int) else pos
+            for pos in posiciones
+        ]
+        absorbidos = [
+            (ticket, vals) for ticket, vals, pos in zip(tickets, vals_list, posiciones)
+            if not isinstance(pos, int) or nuevos_vals[pos] is not vals
+        ]
+        if absorbidos:
+            self._registrar_avisos(absorbidos)
+        return self.browse([ticket.id for ticket in tickets])
+
+    @api.model
+    def _registrar_avisos(self, absorbidos):
+        """
+        Suma los avisos absorbidos a sus tickets (una sentencia UPDATE),
+        guarda cada aviso en el historial con su descripción y conserva sus
+        referencias externas para reconocer los reintentos.
+        """
+        contador = defaultdict(int)
+        for ticket, _vals in absorbidos:
+            contador[ticket.id] += 1
+        self.flush_model(['avisos_count', 'ultimo_aviso'])
+        self.env.cr.execute("""
+            UPDATE ticket_incidencia AS t
+               SET avisos_count = t.avisos_count + v.n,
+                   ultimo_aviso = %s
+              FROM unnest(%s::int[], %s::int[]) AS v(id, n)
+             WHERE t.id = v.id
+        """, [fields.Datetime.now(), list(contador), list(contador.values())])
+        self.browse(list(contador)).invalidate_recordset(['avisos_count', 'ultimo_aviso'])
+        self.env['ticket.historial'].create([{
+            'incidencia_id': ticket.id,
+            'code': 'aviso_absorbido',
+            'notes': vals.get('descripcion') or vals.get('equipo_afectado'),
+        } for ticket, vals in absorbidos])
+        self.env['soporte.ticket.aviso'].create([{
+            'incidencia_id': ticket.id,
+            'external_ref': vals['external_ref'],
+        } for ticket, vals in absorbidos if vals.get('external_ref')])
+
+    @instrumentado
+    def action_fusionar_duplicados(self):
+        """
+        Fusiona los tickets seleccionados que comparten huella: en cada grupo
+        el ticket más antiguo recibe historial, productos, visitas y
+        evaluaciones de los demás, que quedan cancelados y enlazados a él.
+        Cada traspaso es una sentencia SQL sobre todos los grupos a la vez;
+        el contador almacenado de tickets de las plantillas de los productos
+        traspasados se recalcula después, porque el SQL no pasa por el ORM.
+        La cancelación de los duplicados no cuenta como cancelación en los
+        KPI diarios: el aviso sigue vivo en el ticket que los absorbe.
+        """
+        grupos = defaultdict(lambda: self.browse())
+        for rec in self.filtered(lambda r: r.huella and r.state != 'cancelled').sorted('id'):
+            grupos[rec.huella] |= rec
+        origen, destino = [], []
+        for grupo in grupos.values():
+            for duplicado in grupo[1:]:
+                origen.append(duplicado.id)
+                destino.append(grupo[0].id)
+        if not origen:
+            return True
+        duplicados = self.browse(origen)
+        if duplicados.filtered('invoice_id'):
+            raise UserError(_("No se pueden fusionar tickets ya facturados."))
+
+        self.env.flush_all()
+        cr = self.env.cr
+        mapa = "unnest(%(origen)s::int[], %(destino)s::int[]) AS v(origen, destino)"
+        params = {'origen': origen, 'destino': destino}
+        for table in ('ticket_historial', 'cita_visita_soporte', 'soporte_ticket_aviso'):
+            cr.execute(f"""
+                UPDATE {table} AS x SET incidencia_id = v.destino
+                  FROM {mapa} WHERE x.incidencia_id = v.origen
+            """, params)
+        # Las evaluaciones guardan técnico y cliente del ticket (related
+        # almacenados para los informes): se actualizan en la misma sentencia
+        cr.execute(f"""
+            UPDATE evaluacion AS x
+               SET incidencia_id = v.destino,
+                   technician_id = t.technician_id,
+                   partner_id = t.partner_id
+              FROM {mapa}
+              JOIN ticket_incidencia AS t ON t.id = v.destino
+             WHERE x.incidencia_id = v.origen
+        """, params)
+        cr.execute("SELECT DISTINCT product_id FROM ticket_producto_rel WHERE ticket_id = ANY(%s)", [origen])
+        productos = self.env['product.product'].browse([row[0] for row in cr.fetchall()])
+        cr.execute(f"""
+            INSERT INTO ticket_producto_rel (ticket_id, product_id)
+            SELECT v.destino, rel.product_id
+              FROM ticket_producto_rel AS rel JOIN {mapa} ON rel.ticket_id = v.origen
+            ON CONFLICT DO NOTHING
+        """, params)
+        cr.execute("DELETE FROM ticket_producto_rel WHERE ticket_id = ANY(%s)", [origen])
+        cr.execute(f"""
+            UPDATE ticket_incidencia AS t
+               SET avisos_count = t.avisos_count + s.n
+              FROM (SELECT v.destino, SUM(d.avisos_count) AS n
+                      FROM ticket_incidencia AS d JOIN {mapa} ON d.id = v.origen
+                     GROUP BY v.destino) AS s
+             WHERE t.id = s.destino
+        """, params)
+        self.env.invalidate_all()
+        if productos:
+            Plantilla = self.env['product.template']
+            self.env.add_to_compute(Plantilla._fields['ticket_count'], productos.product_tmpl_id)
+            Plantilla.flush_model(['ticket_count'])
+
+        # Las visitas cambian de ticket: su evento lleva la referencia del ticket
+        self.env['cita.visita.soporte'].search([('incidencia_id', 'in', destino)])._sync_calendar_events()
+        por_destino = defaultdict(lambda: self.browse())
+        for origen_id, destino_id in zip(origen, destino):
+            por_destino[destino_id] |= self.browse(origen_id)
+        for destino_id, grupo in por_destino.items():
+            grupo.with_context(soporte_fusion=True).write({'state': 'cancelled', 'fusionado_en_id': destino_id})
+        self.env['ticket.historial'].create([{
+            'incidencia_id': destino_id,
+            'code': 'fusionada',
+            'notes': "Fusionados: " + ", ".join(grupo.mapped('name')),
+        } for destino_id, grupo in por_destino.items()])
+        return True
+
+    @api.model
+    def _reservar_referencias(self, cantidad):
+        """
+        Reserva 'cantidad' referencias de la secuencia de tickets.
+        Con la implementación estándar (secuencia PostgreSQL) se piden todos
+        los números con una sola consulta a nextval; en otro caso se recurre
+        a next_by_code número a número.
+        """
+        if not cantidad:
+            return []
+        seq = self.env['ir.sequence'].sudo().search([
+            ('code', '=', 'ticket.incidencia'),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not seq or seq.implementation != 'standard' or seq.use_date_range:
+            return [
+                self.env['ir.sequence'].next_by_code('ticket.incidencia')
+                for _i in range(cantidad)
+            ]
+        self.env.cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            ['ir_sequence_%03d' % seq.id, cantidad],
+        )
+        return [seq.get_next_char(row[0]) for row in self.env.cr.fetchall()]
+
+    @api.model
+    @instrumentado
+    def _alta_externa(self, tickets):
+        """
+        Alta idempotente de tickets desde sistemas externos (API JSON).
+        - Descarta las referencias externas que ya existen, tanto de tickets
+          como de avisos absorbidos (una búsqueda en cada tabla), y las
+          repetidas dentro del propio lote.
+        - Los avisos absorbidos por un ticket abierto se informan como
+          duplicados del ticket que los absorbe.
+        - Reparte entre los técnicos menos cargados los tickets sin técnico.
+        - Crea el resto con un único create(vals_list), con el calendario
+          en diferido para no sincronizar eventos en la petición.
+        Devuelve un resultado por entrada, en el mismo orden.
+        """
+        campos = ('external_ref', 'partner_id', 'technician_id', 'descripcion', 'equipo_afectado')
+        refs = [t.get('external_ref') for t in tickets]
+        if not all(refs):
+            raise UserError(_("Cada ticket debe indicar su referencia externa."))
+        existentes = {
+            aviso.external_ref: aviso.incidencia_id
+            for aviso in self.env['soporte.ticket.aviso'].search([('external_ref', 'in', refs)])
+        }
+        existentes.update({
+            t.external_ref: t for t in self.search([('external_ref', 'in', refs)])
+        })
+        nuevos = {}
+        for datos in tickets:
+            ref = datos['external_ref']
+            if ref not in existentes and ref not in nuevos:
+                if not datos.get('partner_id'):
+                    raise UserError(_("El ticket %s no indica el cliente.", ref))
+                nuevos[ref] = {k: datos[k] for k in campos if datos.get(k)}
+        sin_tecnico = [vals for vals in nuevos.values() if not vals.get('technician_id')]
+        if sin_tecnico:
+            partners = self.env['res.partner'].browse([vals['partner_id'] for vals in sin_tecnico])
+            for vals, tecnico in zip(sin_tecnico, self._elegir_tecnicos(list(partners))):
+                vals['technician_id'] = tecnico.id
+        creados = self.with_context(soporte_calendario_diferido=True).create(list(nuevos.values()))
+        # create devuelve un ticket por entrada, en orden (el que absorbe el
+        # aviso si era un duplicado de otro ticket abierto)
+        por_ref = dict(existentes)
+        por_ref.update(zip(nuevos, creados))
+        nuevos_refs = set(nuevos)
+        resultado = []
+        for ref in refs:
+            ticket = por_ref[ref]
+            resultado.append({
+                'external_ref': ref,
+                'id': ticket.id,
+                'name': ticket.name,
+                # Nuevo solo si el ticket se creó con esta referencia (no absorbido)
+                'duplicado': ref not in nuevos_refs or ticket.external_ref != ref,
+            })
+            # Una referencia repetida en el lote solo cuenta como nueva la primera vez
+            nuevos_refs.discard(ref)
+        return resultado
+
+    @instrumentado
     def write(self, vals):
         """
         Al modificar campos:
         - Si cambia 'state', actualiza event_start/event_stop según corresponda.
         - Registra cada cambio de estado en el historial.
         - Sincroniza el evento de calendario tras los cambios.
+
+        Todo se hace por lotes sobre el recordset completo, de modo que un cambio
+        masivo desde la lista cuesta un número casi constante de consultas.
         """
+        # Técnicos cuya carga de trabajo puede cambiar con esta escritura
+        tecnicos = self.technician_id if ('state' in vals or 'technician_id' in vals) else None
+        # Tickets que realmente cambian de estado (para los contadores de KPI)
+        cambian = self.filtered(lambda r: r.state != vals['state']) if 'state' in vals else None
         res = super().write(vals)
         if 'state' in vals:
-            for rec in self:
-                new_state = vals['state']
-                if new_state == 'assigned' and not rec.event_start:
-                    rec.event_start = fields.Datetime.now()
-                if new_state in ('done', 'cancelled') and not rec.event_stop:
-                    rec.event_stop = fields.Datetime.now()
-                rec.create_historial_entry(
-                    f"Estado cambiado a {dict(self._fields['state'].selection)[new_state]}"
-                )
-        for rec in self:
-            rec._sync_event()
+            self._aplicar_transicion(vals['state'], cambian)
+        if any(field in vals for field in self._CAMPOS_EVENTO):
+            self._sync_event()
+        if tecnicos is not None and (tecnicos | self.technician_id):
+            self.env['hr.employee']._programar_carga_trabajo()
         return res
 
+    def unlink(self):
+        tecnicos = self.technician_id
+        res = super().unlink()
+        if tecnicos:
+            self.env['hr.employee']._programar_carga_trabajo()
+        return res
+
+    def _aplicar_transicion(self, new_state, cambian=None):
+        """
+        Motor de transiciones por lotes:
+        - Sella event_start/event_stop con una sola escritura para todos los
+          tickets que aún no tengan la fecha.
+        - Crea todas las entradas de historial con un único create(vals_list).
+        - Suma a los contadores diarios de KPI los tickets que cambian de
+          estado ('cambian', por defecto todo el recordset) con un upsert,
+          salvo en la cancelación de los duplicados fusionados.
+        """
+        if not self:
+            return
+        stamp_field = False
+        if new_state == 'assigned':
+            stamp_field = 'event_start'
+        elif new_state in ('done', 'cancelled'):
+            stamp_field = 'event_stop'
+        if stamp_field:
+            pending = self.filtered(lambda r: not r[stamp_field])
+            if pending:
+                # Escribimos saltándonos nuestro write para no volver a entrar
+                # en el motor ni disparar una sincronización por registro
+                super(TicketIncidencia, pending).write({stamp_field: fields.Datetime.now()})
+        if new_state == 'assigned':
+            # Tickets creados sin contrato en vigor: el SLA se calcula al asignarlos
+            self.filtered(lambda r: not r.sla_politica_id)._asignar_sla_pendiente()
+        label = dict(self._fields['state'].selection)[new_state]
+        self.create_historial_entry(f"Estado cambiado a {label}", code=f'estado_{new_state}')
+        if new_state in EVENTO_ESTADO and not self.env.context.get('soporte_fusion'):
+            self.env['soporte.kpi.diario']._sumar(
+                EVENTO_ESTADO[new_state], self if cambian is None else cambian
+            )
+
+    @api.model
+    def _valores_sla(self, partners, inicio):
+        """
+        Valores SLA (política y plazos) de cada cliente: {partner_id: vals}.
+        Una sola búsqueda de contratos para todo el lote; los plazos se
+        calculan una vez por política con el calendario laboral de la compañía.
+        """
+        politicas = self.env['soporte.contrato']._get_politicas_sla(
+            partners.commercial_partner_id.ids, inicio.date()
+        )
+        if not politicas:
+            return {}
+        calendario = self.env.company.resource_calendar_id
+        por_politica = {}
+        res = {}
+        for partner in partners:
+            politica = politicas.get(partner.commercial_partner_id.id)
+            if not politica:
+                continue
+            if politica not in por_politica:
+                por_politica[politica] = {
+                    'sla_politica_id': politica.id,
+                    'sla_deadline_respuesta': self._sumar_horas_laborables(
+                        calendario, inicio, politica.horas_respuesta),
+                    'sla_deadline': self._sumar_horas_laborables(
+                        calendario, inicio, politica.horas_resolucion),
+                }
+            res[partner.id] = por_politica[politica]
+        return res
+
+    @api.model
+    def _sumar_horas_laborables(self, calendario, inicio, horas):
+        """
+        Fecha resultante de sumar 'horas' laborables a 'inicio' según el
+        calendario (con ausencias); en horas naturales si no hay calendario.
+        """
+        fecha = calendario and calendario.plan_hours(horas, inicio, compute_leaves=True)
+        return fecha or inicio + datetime.timedelta(hours=horas)
+
+    def _asignar_sla_pendiente(self):
+        """
+        Fija la política y el plazo de resolución de tickets que no tenían SLA,
+        contando desde ahora. Una escritura por política aplicada.
+        """
+        if not self:
+            return
+        sla = self._valores_sla(self.partner_id, fields.Datetime.now())
+        grupos = defaultdict(lambda: self.browse())
+        for rec in self:
+            if rec.partner_id.id in sla:
+                grupos[rec.partner_id.id] |= rec
+        for partner_id, tickets in grupos.items():
+            vals = sla[partner_id]
+            super(TicketIncidencia, tickets).write({
+                'sla_politica_id': vals['sla_politica_id'],
+                'sla_deadline': vals['sla_deadline'],
+            })
+
+    @api.model
+    @instrumentado
+    def _cron_escalar_sla(self, batch_size=500):
+        """
+        Tarea programada (cron) que escala los tickets que incumplen su SLA.
+        Cada nivel se busca con una consulta por rango sobre su índice parcial,
+        de modo que el coste depende de los incumplimientos y no de los tickets
+        abiertos. Primero la resolución, para que un ticket que incumple ambos
+        plazos quede directamente en el nivel más alto.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        consultas = [
+            ('resolucion', """
+                SELECT id FROM ticket_incidencia
+                 WHERE state IN ('draft', 'assigned', 'in_progress')
+                   AND (sla_escalado IS NULL OR sla_escalado = 'respuesta')
+                   AND sla_deadline < %s
+                 ORDER BY sla_deadline
+                 LIMIT %s
+            """),
+            ('respuesta', """
+                SELECT id FROM ticket_incidencia
+                 WHERE state = 'draft'
+                   AND sla_escalado IS NULL
+                   AND sla_deadline_respuesta < %s
+                 ORDER BY sla_deadline_respuesta
+                 LIMIT %s
+            """),
+        ]
+        now = fields.Datetime.now()
+        for nivel, query in consultas:
+            while True:
+                self.flush_model(['state', 'sla_escalado', 'sla_deadline', 'sla_deadline_respuesta'])
+                self.env.cr.execute(query, [now, batch_size])
+                tickets = self.browse([row[0] for row in self.env.cr.fetchall()])
+                if not tickets:
+                    break
+                tickets._escalar_sla(nivel)
+                if auto_commit:
+                    self.env.cr.commit()
+                self.env.invalidate_all()
+
+    def _escalar_sla(self, nivel):
+        """
+        Marca el nivel de escalado de los tickets y avisa con una actividad al
+        responsable del técnico (o al propio técnico si no tiene responsable).
+        Una escritura, un create de actividades y uno de historial por lote.
+        """
+        super(TicketIncidencia, self).write({'sla_escalado': nivel})
+        label = dict(self._fields['sla_escalado'].selection)[nivel]
+        res_model_id = self.env['ir.model']._get_id(self._name)
+        activity_type_id = self.env.ref('mail.mail_activity_data_todo').id
+        today = fields.Date.context_today(self)
+        activity_vals = []
+        for rec in self:
+            user = rec.technician_id.parent_id.user_id or rec.technician_id.user_id
+            if not user:
+                continue
+            activity_vals.append({
+                'res_model_id': res_model_id,
+                'res_id': rec.id,
+                'activity_type_id': activity_type_id,
+                'summary': f"SLA: {label}",
+                'date_deadline': today,
+                'user_id': user.id,
+            })
+        self.env['mail.activity'].create(activity_vals)
+        self.create_historial_entry(f"SLA: {label}", code=f'sla_{nivel}')
+
+    @instrumentado
     def _sync_event(self):
         """
-        Crea o actualiza un evento de calendario para este ticket:
+        Crea o actualiza los eventos de calendario de los tickets:
         - Si el ticket se cancela, borra el evento.
         - En otros casos, valida que el técnico tenga usuario y ajusta fecha/hora.
+        La sincronización se hace por lotes con soporte.calendar.mixin.
+
+        Si la compañía trabaja en modo diferido (o se pide en el contexto con
+        'soporte_calendario_diferido'), solo se marcan los tickets como
+        pendientes y el cron _cron_sincronizar_calendario hace el resto.
         """
-        for rec in self:
-            if rec.state == 'cancelled':
-                if rec.event_id:
-                    rec.event_id.unlink()
-                    rec.event_id = False
-                continue
+        if self.filtered(lambda r: r.state != 'cancelled' and not r.technician_id.user_id):
+            raise ValidationError("El técnico debe tener un usuario válido asignado.")
+        if self.env.company.soporte_calendario_diferido or self.env.context.get('soporte_calendario_diferido'):
+            self._marcar_calendario_pendiente()
+            return
+        self._sync_calendar_events()
 
-            if not rec.technician_id.user_id:
-                raise ValidationError("El técnico debe tener un usuario válido asignado.")
-
-            # Determina las fechas de inicio/parada del evento
-            start = rec.event_start or fields.Datetime.now()
-            stop = rec.event_stop or (start + datetime.timedelta(hours=1))
-
-            event_vals = {
-                'name':        f"Visita: {rec.name}",
-                'start':       start,
-                'stop':        stop,
-                'allday':      False,
-                'user_id':     rec.technician_id.user_id.id,
-                'description': (
-                    f"Ticket #{rec.name} para {rec.partner_id.name}\n"
-                    f"Estado: {rec.state}\n\n"
-                    f"{rec.descripcion or ''}\n"
-                    f"Equipo Afectado: {rec.equipo_afectado or 'No especificado'}"
-                ),
-            }
-
-            if rec.event_id:
-                rec.event_id.write(event_vals)
-            else:
-                rec.event_id = self.env['calendar.event'].create(event_vals)
+    def _marcar_calendario_pendiente(self):
+        """
+        Marca los tickets como pendientes de sincronizar y adelanta la
+        ejecución del cron para que el calendario se ponga al día enseguida.
+        """
+        pending = self.filtered(lambda r: not r.calendar_dirty)
+        if not pending:
+            return
+        super(TicketIncidencia, pending).write({'calendar_dirty': True})
+        cron = self.env.ref('soporte_gestion.ir_cron_sincronizar_calendario', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
 
+    @api.model
+    @instrumentado
+    def _cron_sincronizar_calendario(self, batch_size=500):
+        """
+        Tarea programada (cron) que:
+        - Recorre por lotes los tickets marcados como pendientes.
+        - Sincroniza sus eventos de calendario y limpia la marca.
+        Es idempotente: volver a ejecutarla sobre tickets ya sincronizados
+        no escribe nada en calendar.event.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        while True:
+            tickets = self.search([('calendar_dirty', '=', True)], order='id', limit=batch_size)
+            if not tickets:
+                break
+            # Los tickets sin usuario de técnico no pueden tener evento;
+            # se reintentarán cuando se corrijan y vuelvan a guardarse
+            tickets.filtered(
+                lambda r: r.state == 'cancelled' or r.technician_id.user_id
+            )._sync_calendar_events()
+            super(TicketIncidencia, tickets).write({'calendar_dirty': False})
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    def _prepare_event_vals(self):
+        """
+        Valores del evento de calendario asociado a este ticket
+        (None si está cancelado y el evento debe borrarse).
+        """
+        self.ensure_one()
+        if self.state == 'cancelled':
+            return None
+        # Determina las fechas de inicio/parada del evento
+        start = self.event_start or fields.Datetime.now()
+        stop = self.event_stop or (start + datetime.timedelta(hours=1))
+        return {
+            'name':        f"Visita: {self.name}",
+            'start':       start,
+            'stop':        stop,
+            'allday':      False,
+            'user_id':     self.technician_id.user_id.id,
+            'description': (
+                f"Ticket #{self.name} para {self.partner_id.name}\n"
+                f"Estado: {self.state}\n\n"
+                f"{self.descripcion or ''}\n"
+                f"Equipo Afectado: {self.equipo_afectado or 'No especificado'}"
+            ),
+        }
+
+    @instrumentado
     def action_start(self):
         """
         Pasa los tickets 'assigned' a 'in_progress', publica mensaje y historial.
         """
-        for rec in self.filtered(lambda r: r.state == 'assigned'):
-            rec.state = 'in_progress'
-            rec.message_post(body="Trabajo en progreso iniciado.")
-            rec.create_historial_entry("Trabajo en progreso iniciado")
+        tickets = self.filtered(lambda r: r.state == 'assigned')
+        tickets._transicion_con_aviso('in_progress', "Trabajo en progreso iniciado", 'iniciada')
         return True
 
+    @instrumentado
     def action_done(self):
         """
         Marca tickets como 'done' si estaban en 'assigned' o 'in_progress'.
         Agrega mensaje en chatter e historial.
         """
-        for rec in self.filtered(lambda r: r.state in ('assigned', 'in_progress')):
-            rec.state = 'done'
-            rec.message_post(body="Trabajo completado.")
-            rec.create_historial_entry("Trabajo completado")
+        tickets = self.filtered(lambda r: r.state in ('assigned', 'in_progress'))
+        tickets._transicion_con_aviso('done', "Trabajo completado", 'completada')
         return True
 
+    @instrumentado
     def action_cancel(self):
         """
         Cancela el ticket, publica mensaje e historial,
         y a su vez el método de write borrará el evento.
         """
-        for rec in self:
-            rec.state = 'cancelled'
-            rec.message_post(body="Ticket cancelado.")
-            rec.create_historial_entry("Ticket cancelado")
+        self._transicion_con_aviso('cancelled', "Ticket cancelado", 'cancelada')
         return True
 
+    @instrumentado
     def action_generate_invoice(self):
         """
         Genera una factura con los productos/servicios del ticket.
@@ -197,17 +884,115 @@ class TicketIncidencia(models.Model):
         Abre el formulario de la factura creada.
         """
         self.ensure_one()
-        if not self.product_ids:
-            raise ValidationError("No hay productos o servicios seleccionados.")
-        lines = [
-            (0, 0, {
+        inv = self._generate_invoices(agrupar='ticket')
+        return {
+            'name': 'Factura',
+            'view_mode': 'form',
+            'res_model': 'account.move',
+            'res_id': inv.id,
+            'type': 'ir.actions.act_window',
+        }
+
+    def _generate_invoices(self, agrupar='partner'):
+        """
+        Genera en una sola pasada las facturas de todos los tickets:
+        - agrupar='partner': una factura por cliente, con una sección por ticket.
+        - agrupar='ticket': una factura por ticket.
+        Lee precios y nombres de todos los productos de una vez, resuelve la
+        cobertura de contratos de todos los clientes con una búsqueda, crea
+        todas las facturas con un único create(vals_list) y enlaza tickets y
+        facturas con un único UPDATE.
+        Solo se facturan tickets completados y sin factura.
+        Devuelve las facturas creadas.
+        """
+        no_facturables = self.filtered(lambda r: r.state != 'done' or r.invoice_id)
+        if no_facturables:
+            raise UserError(_(
+                "Solo se pueden facturar tickets completados y sin factura: %s",
+                ", ".join(no_facturables.mapped('name')),
+            ))
+        sin_productos = self.filtered(lambda r: not r.product_ids)
+        if sin_productos:
+            raise ValidationError(
+                "No hay productos o servicios seleccionados en: %s"
+                % ", ".join(sin_productos.mapped('name'))
+            )
+
+        # Precargamos precio y nombre de todos los productos en bloque
+        products = self.product_ids
+        product_data = {p.id: (p.display_name, p.lst_price) for p in products}
+
+        # Cobertura de contratos activos hoy de todos los clientes, una consulta
+        hoy = fields.Date.context_today(self)
+        por_comercial = self.env['soporte.contrato']._get_coberturas(
+            set(self.partner_id.commercial_partner_id.ids), hoy
+        )
+        coberturas = {
+            partner.id: por_comercial[partner.commercial_partner_id.id]
+            for partner in self.partner_id
+        }
+
+        # Agrupamos los tickets conservando el orden de aparición
+        groups = {}
+        for rec in self:
+            key = rec.partner_id.id if agrupar == 'partner' else rec.id
+            groups.setdefault(key, self.browse())
+            groups[key] |= rec
+
+        move_vals = []
+        for tickets in groups.values():
+            lines = []
+            for rec in tickets:
+                if len(tickets) > 1:
+                    lines.append((0, 0, {
+                        'display_type': 'line_section',
+                        'name': rec.name,
+                    }))
+                lines += rec._prepare_invoice_lines(product_data, coberturas[rec.partner_id.id])
+            move_vals.append({
+                'move_type': 'out_invoice',
+                'partner_id': tickets[0].partner_id.id,
+                'invoice_origin': ", ".join(tickets.mapped('name')),
+                'ticket_id': tickets[0].id,
+                'invoice_line_ids': lines,
+            })
+
+        moves = self.env['account.move'].create(move_vals)
+        # Enlace de todos los tickets con su factura en una sola sentencia
+        ids, move_ids = [], []
+        for tickets, move in zip(groups.values(), moves):
+            ids += tickets.ids
+            move_ids += [move.id] * len(tickets)
+        self.flush_recordset(['invoice_id'])
+        self.env.cr.execute("""
+            UPDATE ticket_incidencia AS t
+               SET invoice_id = v.move_id,
+                   write_uid = %s,
+                   write_date = (now() at time zone 'UTC')
+              FROM unnest(%s::int[], %s::int[]) AS v(id, move_id)
+             WHERE t.id = v.id
+        """, [self.env.uid, ids, move_ids])
+        self.invalidate_recordset(['invoice_id', 'write_uid', 'write_date'])
+        return moves
+
+    def _prepare_invoice_lines(self, product_data, cobertura=None):
+        """
+        Líneas de factura (comandos de creación) de este ticket.
+        product_data: {product_id: (nombre, precio)} precargado para el lote.
+        cobertura: {product_id: descuento} de los contratos del cliente.
+        """
+        cobertura = cobertura or {}
+        self.ensure_one()
+        lines = []
+        for p in self.product_ids:
+            name, price = product_data[p.id]
+            lines.append((0, 0, {
                 'product_id': p.id,
-                'name':       p.display_name,
+                'name':       name,
                 'quantity':   1,
-                'price_unit': p.lst_price
-            })
-            for p in self.product_ids
-        ]
+                'price_unit': price,
+                'discount':   cobertura.get(p.id, 0.0),
+            }))
         if self.descripcion:
             lines.append((0, 0, {
                 'name': self.descripcion,
@@ -215,31 +1000,119 @@ class TicketIncidencia(models.Model):
                 'price_unit': 0.0,
                 'product_id': False,
             }))
-        inv = self.env['account.move'].create({
-            'move_type': 'out_invoice',
-            'partner_id': self.partner_id.id,
-            'invoice_origin': self.name,
-            'invoice_line_ids': lines,
-        })
-        return {
-            'name': 'Factura',
-            'view_mode': 'form',
-            'res_model': 'account.move',
-            'res_id': inv.id,
-            'type': 'ir.actions.act_window',
+        return lines
+
+    @instrumentado
+    def action_auto_asignar(self):
+        """
+        Asigna los tickets en borrador al técnico elegible menos cargado.
+        Los candidatos y su carga se leen en dos consultas y el reparto
+        se hace en memoria, así que el coste no depende del número de tickets.
+        Cada técnico recibe sus tickets con una única escritura.
+
+        Los tickets abiertos de cada técnico se cuentan en el momento, así
+        que lotes consecutivos parten de la carga real; las visitas y horas
+        de calendario salen de la instantánea del empleado, que el cron
+        refresca tras cada cambio y puede ir unos minutos por detrás.
+        """
+        tickets = self.filtered(lambda r: r.state == 'draft')
+        if not tickets:
+            return True
+        asignaciones = defaultdict(lambda: self.browse())
+        for ticket, tecnico in zip(tickets, self._elegir_tecnicos([t.partner_id for t in tickets])):
+            asignaciones[tecnico] |= ticket
+        for tecnico, grupo in asignaciones.items():
+            grupo.write({'technician_id': tecnico.id, 'state': 'assigned'})
+        return True
+
+    @api.model
+    def _elegir_tecnicos(self, partners):
+        """
+        Reparte una lista de clientes (uno por ticket) entre los técnicos
+        elegibles, eligiendo cada vez el menos cargado. Devuelve la lista de
+        técnicos en el mismo orden. El reparto se hace en memoria.
+
+        Los tickets abiertos se cuentan en vivo con una agregación (índice
+        parcial de tickets abiertos por técnico) en lugar de leer la
+        instantánea, que solo se refresca en el cron: así dos asignaciones
+        seguidas no parten de la misma carga. Visitas y horas, que cambian
+        menos, se toman de la instantánea.
+        """
+        candidatos = self.env['hr.employee']._candidatos_asignacion()
+        if not candidatos:
+            raise UserError(_("No hay técnicos de soporte con usuario en esta compañía para asignar."))
+        abiertos = {
+            grupo['technician_id'][0]: grupo['technician_id_count']
+            for grupo in self.read_group(
+                [('technician_id', 'in', candidatos.ids), ('state', 'in', ESTADOS_ABIERTOS)],
+                ['technician_id'], ['technician_id'],
+            )
         }
 
+        # Montículo de (tickets, visitas, horas, posición) para sacar siempre el menos cargado
+        heap = [
+            (abiertos.get(emp.id, 0), emp.carga_visitas_proximas, emp.carga_horas_ocupadas, idx)
+            for idx, emp in enumerate(candidatos)
+        ]
+        heapq.heapify(heap)
+        elegidos = []
+        for partner in partners:
+            apartados = []
+            elegido = None
+            while heap:
+                carga = heapq.heappop(heap)
+                emp = candidatos[carga[3]]
+                # El técnico no puede ser el mismo usuario que el cliente
+                if partner.user_id and partner.user_id == emp.user_id:
+                    apartados.append(carga)
+                    continue
+                elegido = carga
+                break
+            for carga in apartados:
+                heapq.heappush(heap, carga)
+            if elegido is None:
+                raise ValidationError("El técnico no puede ser el mismo que el cliente.")
+            elegidos.append(candidatos[elegido[3]])
+            heapq.heappush(heap, (elegido[0] + 1,) + elegido[1:])
+        return elegidos
+
+    @instrumentado
     def action_set_assigned(self):
         """
         Cambia manualmente de 'draft' a 'assigned',
         publica mensaje e historial.
         """
-        for rec in self.filtered(lambda r: r.state == 'draft'):
-            rec.state = 'assigned'
-            rec.message_post(body="Estado cambiado manualmente a 'Asignado'.")
-            rec.create_historial_entry("Estado cambiado manualmente a 'Asignado'")
+        tickets = self.filtered(lambda r: r.state == 'draft')
+        tickets._transicion_con_aviso('assigned', "Estado cambiado manualmente a 'Asignado'", 'asignada_manual')
         return True
 
+    def _transicion_con_aviso(self, new_state, texto, code):
+        """
+        Cambia el estado de los tickets con una escritura y deja constancia:
+        - Modo normal: seguimiento del campo estado, un message_post por
+          ticket y una entrada de historial adicional con el código de la acción.
+        - Chatter consolidado (opción de la compañía): sin seguimiento del
+          estado y una única nota por ticket con el cambio y la acción, creadas
+          todas con _message_log_batch (sin notificar a los seguidores). La
+          entrada de historial de la acción se omite, porque el motor de
+          transiciones ya registra el cambio de estado.
+        """
+        if not self:
+            return
+        if not self.env.company.soporte_chatter_consolidado:
+            self.write({'state': new_state})
+            for rec in self:
+                rec.message_post(body=f"{texto}.")
+            self.create_historial_entry(texto, code=code)
+            return
+        labels = dict(self._fields['state'].selection)
+        previos = {rec.id: rec.state for rec in self}
+        self.with_context(mail_notrack=True).write({'state': new_state})
+        self._message_log_batch(bodies={
+            rec.id: Markup("%s: %s → %s") % (texto, labels.get(previos[rec.id], ''), labels[new_state])
+            for rec in self
+        })
+
     @api.constrains('technician_id', 'partner_id')
     def _check_technician_not_client(self):
         """
@@ -253,11 +1126,131 @@ class TicketIncidencia(models.Model):
             ):
                 raise ValidationError("El técnico no puede ser el mismo que el cliente.")
 
-    def create_historial_entry(self, notes):
+    def _compute_historial_count(self):
+        """
+        Cuenta las entradas de historial de todos los tickets con un único read_group.
+        """
+        data = self.env['ticket.historial'].read_group(
+            [('incidencia_id', 'in', self.ids)], ['incidencia_id'], ['incidencia_id']
+        )
+        counts = {d['incidencia_id'][0]: d['incidencia_id_count'] for d in data}
+        for rec in self:
+            rec.historial_count = counts.get(rec.id, 0)
+
+    def _compute_texto_busqueda(self):
+        # Campo solo de búsqueda
+        self.texto_busqueda = False
+
+    def _search_texto_busqueda(self, operator, value):
+        """
+        Tickets cuyo texto o cuyas notas de historial casan con la consulta
+        (sintaxis de buscador web: palabras, "frases", -exclusiones).
+        Ambas partes se resuelven con los índices GIN de texto completo.
         """
-        Auxiliar para añadir una nota al historial del ticket.
+        if operator not in ('ilike', 'like', '=', 'not ilike', 'not like', '!='):
+            raise UserError(_("Operador no admitido en la búsqueda de texto: %s", operator))
+        if not value:
+            return []
+        self.flush_model(['descripcion', 'equipo_afectado'])
+        self.env['ticket.historial'].flush_model(['notes', 'incidencia_id'])
+        query = f"""
+            SELECT id FROM ticket_incidencia
+             WHERE texto_tsv @@ websearch_to_tsquery('spanish', %s)
+             UNION
+            SELECT incidencia_id FROM ticket_historial
+             WHERE {TSV_HISTORIAL} @@ websearch_to_tsquery('spanish', %s)
         """
-        self.env['ticket.historial'].create({
-            'incidencia_id': self.id,
-            'notes': notes,
+        negativo = operator in ('not ilike', 'not like', '!=')
+        return [('id', 'not inselect' if negativo else 'inselect', (query, [value, value]))]
+
+    def _compute_similares(self):
+        for rec in self:
+            rec.similares_ids = rec._buscar_similares()
+
+    def _buscar_similares(self, limit=10):
+        """
+        Ids de los tickets completados con términos en común con este, del
+        más al menos similar. La consulta OR se forma con los términos más
+        largos del propio ticket (ya normalizados por el diccionario
+        español) y se resuelve con el índice GIN de texto_tsv; de los que
+        casan solo se puntúan con ts_rank los MAX_CANDIDATOS_SIMILARES más
+        recientes, leyendo el vector almacenado, para que un término común
+        no obligue a puntuar todos los tickets completados.
+        """
+        self.ensure_one()
+        if not self.id or not (self.descripcion or self.equipo_afectado):
+            return []
+        self.flush_model(['descripcion', 'equipo_afectado', 'state'])
+        self.env.cr.execute("""
+            WITH q AS (
+                SELECT to_tsquery('simple', string_agg(quote_literal(lexeme), ' | ')) AS query
+                  FROM (
+                        SELECT lexeme
+                          FROM ticket_incidencia, unnest(texto_tsv)
+                         WHERE id = %(id)s
+                         ORDER BY length(lexeme) DESC
+                         LIMIT %(terminos)s
+                  ) AS terminos
+            ), candidatos AS (
+                SELECT t.id, t.texto_tsv
+                  FROM ticket_incidencia AS t, q
+                 WHERE t.texto_tsv @@ q.query
+                   AND t.state = 'done'
+                   AND t.id != %(id)s
+                 ORDER BY t.id DESC
+                 LIMIT %(candidatos)s
+            )
+            SELECT c.id
+              FROM candidatos AS c, q
+             ORDER BY ts_rank(c.texto_tsv, q.query) DESC, c.id DESC
+             LIMIT %(limit)s
+        """, {
+            'id': self.id, 'terminos': MAX_TERMINOS_SIMILARES,
+            'candidatos': MAX_CANDIDATOS_SIMILARES, 'limit': limit,
         })
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def action_view_similares(self):
+        """
+        Abre los tickets completados más parecidos a este. Se calculan al
+        pulsar el botón, no al abrir el formulario.
+        """
+        self.ensure_one()
+        return {
+            'name': _('Tickets similares'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'ticket.incidencia',
+            'view_mode': 'tree,form',
+            'domain': [('id', 'in', self._buscar_similares())],
+            'context': {'create': False},
+        }
+
+    def action_view_historial(self):
+        """
+        Abre el historial del ticket en una lista paginada.
+        """
+        self.ensure_one()
+        action = self.env['ir.actions.act_window']._for_xml_id('soporte_gestion.action_ticket_historial')
+        action.update({
+            'domain': [('incidencia_id', '=', self.id)],
+            'context': {'default_incidencia_id': self.id},
+        })
+        return action
+
+    def create_historial_entry(self, notes, code=None):
+        """
+        Auxiliar para añadir una nota al historial de cada ticket del recordset.
+        Crea todas las entradas con una única llamada a create.
+        Si la compañía usa el historial compacto y se indica un código fijo,
+        solo se guarda el código y no el texto libre.
+        """
+        if not self:
+            return self.env['ticket.historial']
+        if code and self.env.company.soporte_historial_compacto:
+            entry = {'code': code}
+        else:
+            entry = {'code': code or False, 'notes': notes}
+        return self.env['ticket.historial'].create([
+            dict(entry, incidencia_id=rec.id)
+            for rec in self
+        ])
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import evaluacion_informe
+from . import metrica_resumen
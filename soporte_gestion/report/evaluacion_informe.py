@@ -0,0 +1,186 @@
+from odoo import models, fields, api
+
+
+class EvaluacionInformeMixin(models.AbstractModel):
+    """
+    Base de los informes de satisfacción respaldados por vistas materializadas.
+
+    Cada fila agrega las evaluaciones calificadas de un grupo (mes y
+    dimensión). Las medias y el NPS se guardan por fila y read_group los
+    recalcula a partir de las sumas, de modo que al agrupar filas en el
+    pivot la media queda ponderada por el número de evaluaciones.
+
+    NPS en escala 1-5: promotores = 5, detractores = 1-3.
+    """
+    _name = 'evaluacion.informe.mixin'
+    _description = 'Base de informes de satisfacción'
+    _auto = False
+
+    mes = fields.Date('Mes', readonly=True)
+    total = fields.Integer('Evaluaciones', readonly=True)
+    suma_puntuacion = fields.Integer('Suma de puntuaciones', readonly=True)
+    promotores = fields.Integer('Promotores', readonly=True)
+    detractores = fields.Integer('Detractores', readonly=True)
+    puntuacion_media = fields.Float('Puntuación media', readonly=True, group_operator='avg')
+    nps = fields.Float('NPS', readonly=True, group_operator='avg')
+
+    # Medidas de las que se deducen la media y el NPS de cada grupo
+    _CAMPOS_SUMA = ('total', 'suma_puntuacion', 'promotores', 'detractores')
+
+    def _query(self):
+        """SELECT que define la vista materializada (una fila por grupo)."""
+        raise NotImplementedError()
+
+    def _columnas_unicas(self):
+        """Columnas del índice único que exige REFRESH ... CONCURRENTLY."""
+        raise NotImplementedError()
+
+    def init(self):
+        """
+        (Re)crea la vista materializada ya poblada. Se ejecuta al instalar o
+        actualizar el módulo, de modo que un cambio de consulta se aplica solo.
+        """
+        if self._abstract:
+            return
+        cr = self.env.cr
+        cr.execute(f'DROP MATERIALIZED VIEW IF EXISTS "{self._table}"')
+        cr.execute(f'CREATE MATERIALIZED VIEW "{self._table}" AS ({self._query()})')
+        cr.execute(
+            f'CREATE UNIQUE INDEX "{self._table}_grupo_uniq" ON "{self._table}" ({", ".join(self._columnas_unicas())})'
+        )
+
+    def _refrescar(self):
+        """
+        Refresca la vista sin bloquear las lecturas: PostgreSQL recalcula la
+        consulta y solo aplica las filas que han cambiado.
+        """
+        self.env.cr.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY "{self._table}"')
+        self.invalidate_model()
+
+    @api.model
+    def read_group(self, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
+        """
+        Media y NPS de cada grupo calculados a partir de las sumas, en lugar
+        de promediar las medias de las filas.
+        """
+        nombres = {spec.split(':')[0] for spec in fields}
+        calcular = nombres & {'puntuacion_media', 'nps'}
+        if calcular:
+            fields = list(fields) + [f for f in self._CAMPOS_SUMA if f not in nombres]
+        res = super().read_group(
+            domain, fields, groupby, offset=offset, limit=limit, orderby=orderby, lazy=lazy
+        )
+        if not calcular:
+            return res
+        for grupo in res:
+            total = grupo.get('total') or 0
+            if 'puntuacion_media' in calcular:
+                grupo['puntuacion_media'] = total and (grupo.get('suma_puntuacion') or 0) / total
+            if 'nps' in calcular:
+                neto = (grupo.get('promotores') or 0) - (grupo.get('detractores') or 0)
+                grupo['nps'] = total and 100.0 * neto / total
+        return res
+
+
+class EvaluacionInforme(models.Model):
+    """Satisfacción por mes, técnico y cliente."""
+    _name = 'evaluacion.informe'
+    _inherit = 'evaluacion.informe.mixin'
+    _description = 'Informe de satisfacción por técnico y cliente'
+    _auto = False
+    _rec_name = 'mes'
+    _order = 'mes desc'
+
+    technician_id = fields.Many2one('hr.employee', 'Técnico', readonly=True)
+    partner_id = fields.Many2one('res.partner', 'Cliente', readonly=True)
+
+    def _query(self):
+        return """
+            SELECT MIN(e.id) AS id,
+                   date_trunc('month', e.create_date)::date AS mes,
+                   e.technician_id,
+                   e.partner_id,
+                   COUNT(*) AS total,
+                   SUM(e.score) AS suma_puntuacion,
+                   COUNT(*) FILTER (WHERE e.score = 5) AS promotores,
+                   COUNT(*) FILTER (WHERE e.score <= 3) AS detractores,
+                   AVG(e.score)::float AS puntuacion_media,
+                   100.0 * (COUNT(*) FILTER (WHERE e.score = 5)
+                            - COUNT(*) FILTER (WHERE e.score <= 3)) / COUNT(*) AS nps
+              FROM evaluacion AS e
+             WHERE e.score > 0
+             GROUP BY 2, 3, 4
+        """
+
+    def _columnas_unicas(self):
+        return ['mes', 'technician_id', 'partner_id']
+
+    @api.model
+    def _cron_refrescar(self):
+        """
+        Tarea programada (cron) que refresca los informes de satisfacción
+        solo si han cambiado los datos que leen sus vistas: las evaluaciones
+        calificadas (puntuación, fecha, ticket, técnico y cliente) y los
+        productos de sus tickets. La firma es una suma de hashes de esas
+        columnas, así que editar cualquier otro campo de un ticket no
+        provoca un refresco.
+
+        PostgreSQL no mantiene vistas materializadas de forma incremental:
+        cuando hay cambios, el refresco recalcula la consulta completa y
+        CONCURRENTLY solo aplica las filas que difieren, sin bloquear lecturas.
+        """
+        self.env['evaluacion'].flush_model(['score', 'incidencia_id', 'technician_id', 'partner_id'])
+        self.env['ticket.incidencia'].flush_model(['product_ids'])
+        self.env.cr.execute("""
+            WITH e AS (
+                SELECT id, incidencia_id, technician_id, partner_id, score, create_date
+                  FROM evaluacion
+                 WHERE score > 0
+            )
+            SELECT (SELECT COUNT(*) FROM e),
+                   (SELECT SUM(hashtext(concat_ws(',', id, incidencia_id, technician_id,
+                                                  partner_id, score, create_date))) FROM e),
+                   (SELECT SUM(hashtext(rel.ticket_id || ',' || rel.product_id))
+                      FROM ticket_producto_rel AS rel
+                     WHERE rel.ticket_id IN (SELECT incidencia_id FROM e))
+        """)
+        firma = "|".join(str(valor) for valor in self.env.cr.fetchone())
+        params = self.env['ir.config_parameter'].sudo()
+        if params.get_param('soporte_gestion.informe_satisfaccion_firma') == firma:
+            return
+        self._refrescar()
+        self.env['evaluacion.informe.producto']._refrescar()
+        params.set_param('soporte_gestion.informe_satisfaccion_firma', firma)
+
+
+class EvaluacionInformeProducto(models.Model):
+    """Satisfacción por mes y producto/servicio del ticket."""
+    _name = 'evaluacion.informe.producto'
+    _inherit = 'evaluacion.informe.mixin'
+    _description = 'Informe de satisfacción por producto'
+    _auto = False
+    _rec_name = 'mes'
+    _order = 'mes desc'
+
+    product_id = fields.Many2one('product.product', 'Producto/Servicio', readonly=True)
+
+    def _query(self):
+        return """
+            SELECT row_number() OVER (ORDER BY date_trunc('month', e.create_date), rel.product_id) AS id,
+                   date_trunc('month', e.create_date)::date AS mes,
+                   rel.product_id,
+                   COUNT(*) AS total,
+                   SUM(e.score) AS suma_puntuacion,
+                   COUNT(*) FILTER (WHERE e.score = 5) AS promotores,
+                   COUNT(*) FILTER (WHERE e.score <= 3) AS detractores,
+                   AVG(e.score)::float AS puntuacion_media,
+                   100.0 * (COUNT(*) FILTER (WHERE e.score = 5)
+                            - COUNT(*) FILTER (WHERE e.score <= 3)) / COUNT(*) AS nps
+              FROM evaluacion AS e
+              JOIN ticket_producto_rel AS rel ON rel.ticket_id = e.incidencia_id
+             WHERE e.score > 0
+             GROUP BY 2, 3
+        """
+
+    def _columnas_unicas(self):
+        return ['mes', 'product_id']
@@ -0,0 +1,37 @@
+from odoo import models, fields, tools
+
+
+class SoporteMetricaResumen(models.Model):
+    """Percentiles de duración por método sobre las mediciones retenidas."""
+    _name = 'soporte.metrica.resumen'
+    _description = 'Resumen de operaciones lentas por método'
+    _auto = False
+    _rec_name = 'metodo'
+    _order = 'p95_ms desc'
+
+    modelo = fields.Char('Modelo', readonly=True)
+    metodo = fields.Char('Método', readonly=True)
+    llamadas = fields.Integer('Llamadas', readonly=True)
+    p50_ms = fields.Float('p50 (ms)', readonly=True, group_operator='max')
+    p95_ms = fields.Float('p95 (ms)', readonly=True, group_operator='max')
+    max_ms = fields.Float('Máximo (ms)', readonly=True, group_operator='max')
+    consultas_media = fields.Float('Consultas (media)', readonly=True, group_operator='max')
+    ultima = fields.Datetime('Última', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT MIN(id) AS id,
+                       modelo,
+                       metodo,
+                       COUNT(*) AS llamadas,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY duracion_ms) AS p50_ms,
+                       percentile_cont(0.95) WITHIN GROUP (ORDER BY duracion_ms) AS p95_ms,
+                       MAX(duracion_ms) AS max_ms,
+                       AVG(consultas)::float AS consultas_media,
+                       MAX(fecha) AS ultima
+                  FROM soporte_metrica
+                 GROUP BY modelo, metodo
+            )
+        """)
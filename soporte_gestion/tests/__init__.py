@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+from . import test_rendimiento
+from . import test_indices
+from . import test_duplicados
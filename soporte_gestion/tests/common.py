@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Base de las pruebas de rendimiento de soporte_gestion.
+
+Siembra un volumen sintético con SQL masivo (crear decenas de miles de
+registros con el ORM llevaría más que las propias mediciones), mide
+consultas y tiempo de cada operación y vuelca los resultados a un informe
+JSON para comparar entre versiones (siembra y mediciones se hacen sin el
+chatter de seguimiento de mail.thread):
+
+    SOPORTE_RENDIMIENTO_JSON=/ruta/informe.json \\
+    odoo-bin -d test --test-tags soporte_rendimiento -i soporte_gestion --stop-after-init
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import odoo
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+# Volumen de datos sembrados
+N_TICKETS = 10000
+N_TECNICOS = 1000
+N_CONTRATOS = 50000
+N_HISTORIAL = 100000
+N_CLIENTES = 1000
+N_PRODUCTOS = 20
+# Técnicos con usuario (los únicos que pueden tener eventos de calendario)
+N_TECNICOS_CON_USUARIO = 5
+
+
+class SoporteRendimientoCommon(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Sin mensajes de seguimiento ni suscripciones automáticas de
+        # mail.thread: son un coste estándar por registro, ajeno al módulo,
+        # que ocultaría el de las rutas medidas
+        cls.env = cls.env(context=dict(
+            cls.env.context, tracking_disable=True, mail_create_nolog=True,
+            mail_create_nosubscribe=True, mail_notrack=True,
+        ))
+        cls._resultados = []
+        cls.env.cr.execute(
+            "SELECT latest_version FROM ir_module_module WHERE name = 'soporte_gestion'"
+        )
+        cls.version_modulo = cls.env.cr.fetchone()[0]
+
+        t0 = time.perf_counter()
+        cls._sembrar()
+        cls.segundos_siembra = time.perf_counter() - t0
+        _logger.info("Datos de rendimiento sembrados en %.1f s", cls.segundos_siembra)
+
+    @classmethod
+    def tearDownClass(cls):
+        ruta = os.environ.get('SOPORTE_RENDIMIENTO_JSON') or os.path.join(
+            tempfile.gettempdir(), 'soporte_gestion_rendimiento.json'
+        )
+        informe = {
+            'odoo': odoo.release.version,
+            'modulo': cls.version_modulo,
+            'fecha': fields.Datetime.to_string(fields.Datetime.now()),
+            'datos': {
+                'tickets': N_TICKETS,
+                'tecnicos': N_TECNICOS,
+                'contratos': N_CONTRATOS,
+                'historial': N_HISTORIAL,
+            },
+            'segundos_siembra': round(cls.segundos_siembra, 3),
+            'resultados': cls._resultados,
+        }
+        with open(ruta, 'w', encoding='utf-8') as fichero:
+            json.dump(informe, fichero, indent=2, ensure_ascii=False)
+        _logger.info("Informe de rendimiento escrito en %s", ruta)
+        super().tearDownClass()
+
+    @classmethod
+    def _sembrar(cls):
+        env = cls.env
+        cr = env.cr
+        hoy = fields.Date.context_today(env['res.partner'])
+
+        cls.clientes = env['res.partner'].create([
+            {'name': f'Cliente rendimiento {i}', 'is_company': True}
+            for i in range(N_CLIENTES)
+        ])
+        usuarios = env['res.users'].create([
+            {'name': f'Técnico rendimiento {i}', 'login': f'tecnico_rendimiento_{i}'}
+            for i in range(N_TECNICOS_CON_USUARIO)
+        ])
+        cls.tecnicos = env['hr.employee'].create([
+            {'name': f'Técnico {i}', 'soporte_tecnico': i < N_TECNICOS_CON_USUARIO}
+            for i in range(N_TECNICOS)
+        ])
+        for empleado, usuario in zip(cls.tecnicos, usuarios):
+            empleado.user_id = usuario
+        cls.tecnicos_con_usuario = cls.tecnicos[:N_TECNICOS_CON_USUARIO]
+        cls.productos = env['product.product'].create([
+            {'name': f'Servicio rendimiento {i}', 'sale_ok': True, 'list_price': 50.0}
+            for i in range(N_PRODUCTOS)
+        ])
+        env.flush_all()
+
+        # Tickets repartidos entre los técnicos con usuario y los cuatro estados abiertos/cerrados
+        ahora = fields.Datetime.now()
+        cr.execute("""
+            INSERT INTO ticket_incidencia
+                   (name, partner_id, technician_id, user_id, state, descripcion, equipo_afectado,
+                    event_start, event_stop, avisos_count, ultimo_aviso,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT 'RND/' || lpad(g::text, 6, '0'),
+                   (%(clientes)s::int[])[1 + g %% %(n_clientes)s],
+                   (%(tecnicos)s::int[])[1 + g %% %(n_tecnicos)s],
+                   %(uid)s,
+                   (ARRAY['draft', 'assigned', 'in_progress', 'done'])[1 + g %% 4],
+                   'Incidencia de rendimiento ' || g || ': el equipo no arranca tras actualizar',
+                   'Equipo ' || (g %% 500),
+                   CASE WHEN g %% 4 > 0 THEN %(ahora)s - interval '1 day' * (g %% 30) END,
+                   CASE WHEN g %% 4 = 3 THEN %(ahora)s - interval '1 day' * (g %% 30) + interval '4 hours' END,
+                   1, %(ahora)s,
+                   %(uid)s, %(ahora)s, %(uid)s, %(ahora)s
+              FROM generate_series(1, %(n)s) AS g
+            RETURNING id
+        """, {
+            'clientes': cls.clientes.ids, 'n_clientes': N_CLIENTES,
+            'tecnicos': cls.tecnicos_con_usuario.ids, 'n_tecnicos': N_TECNICOS_CON_USUARIO,
+            'uid': env.uid, 'ahora': ahora, 'n': N_TICKETS,
+        })
+        cls.tickets = cls.env['ticket.incidencia'].browse(sorted(row[0] for row in cr.fetchall()))
+
+        # Dos productos por ticket
+        cr.execute("""
+            INSERT INTO ticket_producto_rel (ticket_id, product_id)
+            SELECT t.id, (%(productos)s::int[])[1 + (t.id + k) %% %(n_productos)s]
+              FROM ticket_incidencia AS t, generate_series(0, 1) AS k
+             WHERE t.id = ANY(%(tickets)s)
+            ON CONFLICT DO NOTHING
+        """, {'productos': cls.productos.ids, 'n_productos': N_PRODUCTOS, 'tickets': cls.tickets.ids})
+
+        # Historial: N_HISTORIAL / N_TICKETS entradas por ticket
+        cr.execute("""
+            INSERT INTO ticket_historial (incidencia_id, date, user_id, code, notes)
+            SELECT t.id, %(ahora)s - interval '1 hour' * k, %(uid)s, 'creada',
+                   CASE WHEN k %% 3 = 0 THEN 'Nota de seguimiento ' || k END
+              FROM ticket_incidencia AS t, generate_series(1, %(por_ticket)s) AS k
+             WHERE t.id = ANY(%(tickets)s)
+        """, {
+            'ahora': ahora, 'uid': env.uid, 'tickets': cls.tickets.ids,
+            'por_ticket': N_HISTORIAL // N_TICKETS,
+        })
+
+        # Contratos: uno de cada diez vencido y aún abierto, uno de cada veinte con renovación
+        cr.execute("""
+            INSERT INTO soporte_contrato
+                   (name, partner_id, periodo, start_date, end_date, amount, currency_id,
+                    state, active, descuento, renovacion_automatica,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT 'RND-' || g,
+                   (%(clientes)s::int[])[1 + g %% %(n_clientes)s],
+                   'mensual',
+                   CASE WHEN g %% 10 = 0 THEN %(hoy)s - 40 ELSE %(hoy)s - 10 END,
+                   CASE WHEN g %% 10 = 0 THEN %(hoy)s - 10 ELSE %(hoy)s + 20 END,
+                   100.0, %(moneda)s, 'open', true, 100.0, g %% 20 = 0,
+                   %(uid)s, %(ahora)s, %(uid)s, %(ahora)s
+              FROM generate_series(1, %(n)s) AS g
+        """, {
+            'clientes': cls.clientes.ids, 'n_clientes': N_CLIENTES, 'hoy': hoy,
+            'moneda': env.company.currency_id.id, 'uid': env.uid, 'ahora': ahora,
+            'n': N_CONTRATOS,
+        })
+
+        cr.execute("ANALYZE ticket_incidencia, ticket_historial, soporte_contrato, ticket_producto_rel")
+        env.invalidate_all()
+        env.registry.clear_caches()
+        cls.clientes = cls.clientes.with_env(cls.env)
+        cls.tecnicos = cls.tecnicos.with_env(cls.env)
+        cls.tecnicos_con_usuario = cls.tecnicos_con_usuario.with_env(cls.env)
+        cls.productos = cls.productos.with_env(cls.env)
+
+    def _tickets_en(self, state, limit):
+        """Tickets sembrados en un estado dado."""
+        return self.tickets.filtered(lambda t: t.state == state)[:limit]
+
+    @contextmanager
+    def medir(self, nombre, presupuesto, registros):
+        """
+        Comprueba con assertQueryCount que la operación no supera su
+        presupuesto de consultas y guarda consultas y tiempo en el informe.
+        """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        consultas_inicio = self.cr.sql_log_count
+        t0 = time.perf_counter()
+        with self.assertQueryCount(presupuesto):
+            yield
+        segundos = time.perf_counter() - t0
+        consultas = self.cr.sql_log_count - consultas_inicio
+        self._resultados.append({
+            'operacion': nombre,
+            'registros': registros,
+            'consultas': consultas,
+            'presupuesto_consultas': presupuesto,
+            'segundos': round(segundos, 4),
+        })
+        _logger.info("%s (%s registros): %s consultas, %.3f s", nombre, registros, consultas, segundos)
+
+    @staticmethod
+    def _manana(horas):
+        """Fecha y hora de mañana, 'horas' después de las 8:00 UTC."""
+        base = fields.Datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        return base + timedelta(days=1, hours=horas)
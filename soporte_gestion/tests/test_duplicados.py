@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Absorción de avisos repetidos y fusión de tickets duplicados.
+
+Ambas rutas traspasan datos con sentencias SQL sobre varias tablas; estas
+pruebas comprueban el resultado visible a través del ORM.
+"""
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('-at_install', 'post_install')
+class TestDuplicados(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.cliente = cls.env['res.partner'].create({'name': 'Cliente duplicados', 'is_company': True})
+        cls.tecnico = cls.env['hr.employee'].create({'name': 'Técnico duplicados'})
+        cls.producto = cls.env['product.product'].create({'name': 'Revisión duplicados'})
+        cls.Ticket = cls.env['ticket.incidencia']
+
+    def _ticket(self, **vals):
+        return self.Ticket.create(dict({
+            'partner_id': self.cliente.id,
+            'technician_id': self.tecnico.id,
+            'equipo_afectado': 'Portátil 7',
+        }, **vals))
+
+    def _cancelados(self):
+        kpis = self.env['soporte.kpi.diario'].search([
+            ('technician_id', '=', self.tecnico.id), ('evento', '=', 'cancelado'),
+        ])
+        return sum(kpis.mapped('cantidad'))
+
+    def test_absorbe_aviso_repetido(self):
+        self.env.company.soporte_ventana_duplicados = 60
+        ticket = self._ticket(descripcion='No arranca')
+        repetido = self._ticket(equipo_afectado='  PORTÁTIL   7 ', descripcion='Sigue sin arrancar')
+        self.assertEqual(repetido, ticket)
+        self.assertEqual(ticket.avisos_count, 2)
+        self.assertEqual(self.Ticket.search_count([('partner_id', '=', self.cliente.id)]), 1)
+        self.assertIn('aviso_absorbido', ticket.historial_ids.mapped('code'))
+
+    def test_no_absorbe_fuera_de_ventana(self):
+        self.env.company.soporte_ventana_duplicados = 60
+        ticket = self._ticket()
+        ticket.ultimo_aviso = fields.Datetime.now() - timedelta(hours=2)
+        self.assertNotEqual(self._ticket(), ticket)
+
+    def test_alta_externa_reintento_de_aviso_absorbido(self):
+        self.env.company.soporte_ventana_duplicados = 60
+        datos = [{
+            'external_ref': ref,
+            'partner_id': self.cliente.id,
+            'technician_id': self.tecnico.id,
+            'equipo_afectado': 'Portátil 7',
+        } for ref in ('MON-1', 'MON-2')]
+        primero, segundo = self.Ticket._alta_externa(datos)
+        self.assertFalse(primero['duplicado'])
+        self.assertTrue(segundo['duplicado'])
+        self.assertEqual(segundo['id'], primero['id'])
+
+        # El sistema de origen reintenta el aviso absorbido: no se vuelve a sumar
+        reintento, = self.Ticket._alta_externa(datos[1:])
+        self.assertTrue(reintento['duplicado'])
+        self.assertEqual(reintento['id'], primero['id'])
+        self.assertEqual(self.Ticket.browse(primero['id']).avisos_count, 2)
+
+    def test_fusion(self):
+        destino = self._ticket(product_ids=[(4, self.producto.id)])
+        duplicado = self._ticket(product_ids=[(4, self.producto.id)], equipo_afectado='portatil 7')
+        cita = self.env['cita.visita.soporte'].create({
+            'incidencia_id': duplicado.id,
+            'technician_id': self.env.user.id,
+            'date': fields.Datetime.now() + timedelta(days=1),
+        })
+        plantilla = self.producto.product_tmpl_id
+        self.assertEqual(plantilla.ticket_count, 2)
+        cancelados = self._cancelados()
+
+        (destino | duplicado).action_fusionar_duplicados()
+
+        self.assertEqual(duplicado.state, 'cancelled')
+        self.assertEqual(duplicado.fusionado_en_id, destino)
+        self.assertFalse(duplicado.product_ids)
+        self.assertEqual(destino.product_ids, self.producto)
+        self.assertEqual(cita.incidencia_id, destino)
+        self.assertIn('fusionada', destino.historial_ids.mapped('code'))
+        self.assertEqual(destino.avisos_count, 2)
+        # El contador almacenado de la plantilla refleja el traspaso
+        self.assertEqual(plantilla.ticket_count, 1)
+        # La fusión no cuenta como cancelación en los KPI, ni en vivo ni al reconstruirlos
+        self.assertEqual(self._cancelados(), cancelados)
+        self.env['soporte.kpi.diario']._reconstruir()
+        self.assertFalse(self._cancelados())
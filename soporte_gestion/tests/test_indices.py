@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Planes de ejecución de las vistas por defecto con un millón de tickets.
+
+Comprueba con EXPLAIN que las consultas que lanzan la lista, las columnas
+del kanban y los calendarios de tickets y citas se resuelven con índices y
+no recorren la tabla entera. Se lanzan junto a las pruebas de rendimiento:
+
+    odoo-bin -d test --test-tags soporte_rendimiento -i soporte_gestion --stop-after-init
+
+El recuento por columna del kanban (read_group sobre toda la tabla) queda
+fuera: agrega todas las filas por definición.
+"""
+from datetime import datetime, time, timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+N_TICKETS = 1000000
+N_CITAS = 200000
+# Días sobre los que se reparten las fechas sembradas
+DIAS_HISTORICO = 1095
+
+# Nodos del plan que leen la tabla a través de un índice
+NODOS_INDICE = {'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+
+
+def _nodos(plan):
+    yield plan
+    for hijo in plan.get('Plans', []):
+        yield from _nodos(hijo)
+
+
+@tagged('-standard', '-at_install', 'post_install', 'soporte_rendimiento')
+class TestIndices(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        env = cls.env
+        cr = env.cr
+        clientes = env['res.partner'].create([
+            {'name': f'Cliente índices {i}', 'is_company': True} for i in range(100)
+        ])
+        tecnicos = env['hr.employee'].create([
+            {'name': f'Técnico índices {i}'} for i in range(50)
+        ])
+        env.flush_all()
+        cls.ahora = fields.Datetime.now()
+
+        # Un cuarto de los tickets en cada estado; fechas repartidas en tres años
+        cr.execute("""
+            INSERT INTO ticket_incidencia
+                   (name, partner_id, technician_id, user_id, state, event_start, event_stop,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT 'IDX/' || lpad(g::text, 7, '0'),
+                   (%(clientes)s::int[])[1 + g %% %(n_clientes)s],
+                   (%(tecnicos)s::int[])[1 + g %% %(n_tecnicos)s],
+                   %(uid)s,
+                   (ARRAY['draft', 'assigned', 'in_progress', 'done'])[1 + g %% 4],
+                   CASE WHEN g %% 4 > 0 THEN %(ahora)s - interval '1 day' * (g %% %(dias)s) END,
+                   CASE WHEN g %% 4 = 3 THEN %(ahora)s - interval '1 day' * (g %% %(dias)s) + interval '4 hours' END,
+                   %(uid)s, %(ahora)s, %(uid)s, %(ahora)s
+              FROM generate_series(1, %(n)s) AS g
+        """, {
+            'clientes': clientes.ids, 'n_clientes': len(clientes),
+            'tecnicos': tecnicos.ids, 'n_tecnicos': len(tecnicos),
+            'uid': env.uid, 'ahora': cls.ahora, 'dias': DIAS_HISTORICO, 'n': N_TICKETS,
+        })
+        cr.execute("""
+            INSERT INTO cita_visita_soporte
+                   (incidencia_id, technician_id, date, duracion, date_end, state,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT t.id, %(uid)s, f.fecha, 1.0, f.fecha + interval '1 hour',
+                   (ARRAY['draft', 'scheduled', 'done'])[1 + t.id %% 3],
+                   %(uid)s, %(ahora)s, %(uid)s, %(ahora)s
+              FROM (SELECT id FROM ticket_incidencia ORDER BY id DESC LIMIT %(n)s) AS t,
+                   LATERAL (SELECT %(ahora)s - interval '1 day' * (t.id %% %(dias)s)
+                                  + interval '1 hour' * (t.id %% 10) AS fecha) AS f
+        """, {'uid': env.uid, 'ahora': cls.ahora, 'dias': DIAS_HISTORICO, 'n': N_CITAS})
+        cr.execute("ANALYZE ticket_incidencia, cita_visita_soporte")
+        env.invalidate_all()
+
+    def assertUsaIndice(self, query, tabla):
+        """Falla si el plan de la consulta recorre 'tabla' secuencialmente."""
+        sql, params = query.select()
+        self.env.cr.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = self.env.cr.fetchone()[0][0]['Plan']
+        lecturas = {nodo['Node Type'] for nodo in _nodos(plan) if nodo.get('Relation Name') == tabla}
+        self.assertNotIn('Seq Scan', lecturas, f"Lectura secuencial de {tabla}:\n{sql}")
+        self.assertTrue(lecturas & NODOS_INDICE, f"{tabla} no se lee por índice:\n{sql}")
+
+    def _semana(self):
+        """Dominio de la vista de calendario para la semana actual."""
+        inicio = datetime.combine(self.ahora.date() - timedelta(days=self.ahora.weekday()), time.min)
+        return inicio, inicio + timedelta(days=7)
+
+    def test_ticket_lista(self):
+        Ticket = self.env['ticket.incidencia']
+        self.assertUsaIndice(Ticket._search([], limit=80), Ticket._table)
+
+    def test_ticket_kanban_columnas(self):
+        Ticket = self.env['ticket.incidencia']
+        for state in ('draft', 'assigned', 'in_progress', 'done', 'cancelled'):
+            with self.subTest(state=state):
+                self.assertUsaIndice(Ticket._search([('state', '=', state)], limit=40), Ticket._table)
+
+    def test_ticket_calendario(self):
+        Ticket = self.env['ticket.incidencia']
+        inicio, fin = self._semana()
+        query = Ticket._search([('event_start', '<=', fin), ('event_stop', '>=', inicio)])
+        self.assertUsaIndice(query, Ticket._table)
+
+    def test_ticket_abiertos_por_tecnico(self):
+        Ticket = self.env['ticket.incidencia']
+        tecnico = Ticket.search([], limit=1).technician_id
+        query = Ticket._search([
+            ('technician_id', '=', tecnico.id), ('state', 'in', ('draft', 'assigned', 'in_progress')),
+        ])
+        self.assertUsaIndice(query, Ticket._table)
+
+    def test_cita_hoy(self):
+        Cita = self.env['cita.visita.soporte']
+        hoy = datetime.combine(self.ahora.date(), time.min)
+        query = Cita._search([('date', '>=', hoy), ('date', '<', hoy + timedelta(days=1))])
+        self.assertUsaIndice(query, Cita._table)
+
+    def test_cita_calendario(self):
+        Cita = self.env['cita.visita.soporte']
+        inicio, fin = self._semana()
+        query = Cita._search([('date', '<=', fin), ('date_end', '>=', inicio)])
+        self.assertUsaIndice(query, Cita._table)
+
+    def test_cita_de_ticket(self):
+        Cita = self.env['cita.visita.soporte']
+        ticket = self.env['ticket.incidencia'].search([], limit=1)
+        self.assertUsaIndice(Cita._search([('incidencia_id', '=', ticket.id)]), Cita._table)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Consultas y tiempos de las rutas críticas con volumen realista.
+
+Fuera de la batería estándar (son lentas de sembrar); se lanzan con
+--test-tags soporte_rendimiento. Los presupuestos de consultas son cotas
+superiores: el número real queda en el informe JSON y, si baja de forma
+estable, conviene ajustar el presupuesto para fijar la mejora.
+"""
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import SoporteRendimientoCommon
+
+# Registros por operación medida
+LOTE = 100
+
+# Presupuesto de consultas de cada operación: (fijo, por registro), de modo
+# que la cota es fijo + por_registro * registros medidos. Se han obtenido
+# contando las sentencias de cada ruta con el chatter de seguimiento
+# desactivado (ver SoporteRendimientoCommon) y redondeando al alza con
+# margen; el informe JSON de cada ejecución da el número real con el que
+# afinarlos:
+# - ticket_create: secuencia (2), contratos/SLA (3), INSERT y constraints
+#   (~15), create por lotes de calendar.event con asistentes (~40),
+#   historial (3), KPI (2) y aviso al cron de carga (1). Nada por ticket.
+# - ticket_write_estado: lectura de estados y UPDATE (3), sellado de fechas
+#   y SLA pendiente (~8), historial y KPI (5), eventos nuevos (~40) y aviso
+#   al cron de carga (1). Nada por ticket.
+# - ticket_action_done: la escritura anterior (~70) más un message_post
+#   por ticket en modo normal (mensaje, destinatarios, notificación: ~6).
+# - ticket_sync_event: lectura de técnicos/clientes (~5), create de eventos
+#   (~40) y enlace en un UPDATE.
+# - ticket_generate_invoice: precios, coberturas y clientes (~10) y el
+#   create por lotes de account.move, que sincroniza líneas dinámicas,
+#   impuestos y totales factura a factura (~15 por factura).
+# - producto_compute_ticket_count: una agregación SQL.
+# - contrato_cron_expirar: búsquedas y UPDATE (~10); por contrato vencido,
+#   la mitad se renueva: referencia con next_by_code (2), alta, activación
+#   y actividad de renovación con la suscripción del usuario (~5), es decir
+#   ~4 por contrato vencido.
+# - cita_action_schedule: validación y UPDATE (~5), solapes (1-3), eventos
+#   (~40) y aviso al cron de carga (1). Nada por cita.
+# - contrato_cron_generar_visitas: búsqueda de contratos y ocurrencias (2),
+#   INSERT con el cliente calculado (~5), solapes (1-3), eventos (~40) y
+#   aviso al cron de carga (1), por lote de creación.
+PRESUPUESTO_CONSULTAS = {
+    'ticket_create': (100, 0),
+    'ticket_write_estado': (100, 0),
+    'ticket_action_done': (100, 6),
+    'ticket_sync_event': (60, 0),
+    'ticket_generate_invoice': (40, 15),
+    'producto_compute_ticket_count': (5, 0),
+    'contrato_cron_expirar': (30, 4),
+    'cita_action_schedule': (80, 0),
+    'contrato_cron_generar_visitas': (100, 0),
+}
+
+
+def presupuesto(nombre, registros):
+    """Cota de consultas de una operación sobre 'registros' registros."""
+    fijo, por_registro = PRESUPUESTO_CONSULTAS[nombre]
+    return fijo + por_registro * registros
+
+
+@tagged('-standard', '-at_install', 'post_install', 'soporte_rendimiento')
+class TestRendimiento(SoporteRendimientoCommon):
+
+    def test_ticket_create(self):
+        vals_list = [{
+            'partner_id': self.clientes[i % len(self.clientes)].id,
+            'technician_id': self.tecnicos_con_usuario[i % len(self.tecnicos_con_usuario)].id,
+            'state': 'assigned',
+            'descripcion': f'Alta de rendimiento {i}',
+            'equipo_afectado': f'Portátil {i}',
+        } for i in range(LOTE)]
+        with self.medir('ticket_create', presupuesto('ticket_create', LOTE), LOTE):
+            tickets = self.env['ticket.incidencia'].create(vals_list)
+        self.assertEqual(len(tickets), LOTE)
+
+    def test_ticket_write_estado(self):
+        tickets = self._tickets_en('draft', LOTE)
+        with self.medir('ticket_write_estado', presupuesto('ticket_write_estado', len(tickets)), len(tickets)):
+            tickets.write({'state': 'assigned'})
+        self.assertEqual(set(tickets.mapped('state')), {'assigned'})
+
+    def test_ticket_action_done(self):
+        tickets = self._tickets_en('in_progress', LOTE)
+        with self.medir('ticket_action_done', presupuesto('ticket_action_done', len(tickets)), len(tickets)):
+            tickets.action_done()
+        self.assertEqual(set(tickets.mapped('state')), {'done'})
+
+    def test_ticket_sync_event(self):
+        tickets = self._tickets_en('assigned', LOTE)
+        with self.medir('ticket_sync_event', presupuesto('ticket_sync_event', len(tickets)), len(tickets)):
+            tickets._sync_event()
+        self.assertTrue(all(tickets.mapped('event_id')))
+
+    def test_ticket_generate_invoice(self):
+        diario = self.env['account.journal'].search([
+            ('type', '=', 'sale'), ('company_id', '=', self.env.company.id),
+        ], limit=1)
+        if not diario:
+            self.skipTest("La compañía de pruebas no tiene diario de ventas")
+        tickets = self._tickets_en('done', LOTE)
+        with self.medir('ticket_generate_invoice', presupuesto('ticket_generate_invoice', len(tickets)), len(tickets)):
+            facturas = tickets._generate_invoices()
+        # Una factura por cliente, y todos los tickets enlazados a la suya
+        self.assertEqual(len(facturas), len(tickets.partner_id))
+        self.assertTrue(all(tickets.mapped('invoice_id')))
+        self.assertEqual(tickets.invoice_id, facturas)
+
+    def test_producto_compute_ticket_count(self):
+        plantillas = self.productos.product_tmpl_id
+        with self.medir('producto_compute_ticket_count',
+                        presupuesto('producto_compute_ticket_count', len(plantillas)), len(plantillas)):
+            plantillas._compute_ticket_count()
+        self.assertTrue(all(plantillas.mapped('ticket_count')))
+
+    def test_contrato_cron_expirar(self):
+        Contrato = self.env['soporte.contrato']
+        hoy = fields.Date.context_today(Contrato)
+        # Solo LOTE contratos vencidos (la mitad con renovación automática);
+        # el resto de los sembrados vuelve a estar en vigor
+        self.env.cr.execute("""
+            UPDATE soporte_contrato SET end_date = %(hoy)s + 20
+             WHERE state = 'open' AND end_date < %(hoy)s
+               AND id NOT IN (SELECT id FROM soporte_contrato
+                               WHERE state = 'open' AND end_date < %(hoy)s
+                               ORDER BY id LIMIT %(lote)s)
+        """, {'hoy': hoy, 'lote': LOTE})
+        self.env.invalidate_all()
+        vencidos = Contrato.search_count([('state', '=', 'open'), ('end_date', '<', hoy)])
+        self.assertEqual(vencidos, LOTE)
+        with self.medir('contrato_cron_expirar', presupuesto('contrato_cron_expirar', vencidos), vencidos):
+            Contrato._cron_expirar_contratos()
+        self.assertFalse(Contrato.search_count([('state', '=', 'open'), ('end_date', '<', hoy)]))
+
+    def test_cita_action_schedule(self):
+        Cita = self.env['cita.visita.soporte']
+        tickets = self._tickets_en('assigned', LOTE)
+        usuarios = self.tecnicos_con_usuario.user_id
+        citas = Cita.browse()
+        for i, ticket in enumerate(tickets):
+            # Citas consecutivas de una hora por técnico: sin solapes
+            citas |= Cita.create({
+                'incidencia_id': ticket.id,
+                'technician_id': usuarios[i % len(usuarios)].id,
+                'date': self._manana(0) + timedelta(hours=i // len(usuarios)),
+                'duracion': 1.0,
+            })
+        with self.medir('cita_action_schedule', presupuesto('cita_action_schedule', len(citas)), len(citas)):
+            citas.action_schedule()
+        self.assertEqual(set(citas.mapped('state')), {'scheduled'})
+
+    def test_contrato_cron_generar_visitas(self):
+        Contrato = self.env['soporte.contrato']
+        Cita = self.env['cita.visita.soporte']
+        hoy = fields.Date.context_today(Contrato)
+        contratos = Contrato.search([('state', '=', 'open'), ('end_date', '>=', hoy)], limit=LOTE)
+        # Con inicio hace 5 días y fin dentro de 60, las ocurrencias mensuales
+        # caen entre hoy+23 y hoy+26 y entre hoy+54 y hoy+57 sea cual sea la
+        # longitud de los meses: exactamente dos visitas por contrato
+        contratos.write({
+            'start_date': hoy - timedelta(days=5),
+            'end_date': hoy + timedelta(days=60),
+            'visita_recurrencia': 'mensual',
+            'visita_technician_id': self.tecnicos_con_usuario[0].user_id.id,
+            'visita_hora': 9.0,
+            'visita_duracion': 1.0,
+        })
+        with self.medir('contrato_cron_generar_visitas',
+                        presupuesto('contrato_cron_generar_visitas', len(contratos)), len(contratos)):
+            Contrato._cron_generar_visitas()
+        visitas = Cita.search([('contrato_id', 'in', contratos.ids)])
+        self.assertEqual(len(visitas), 2 * len(contratos))
+        self.assertEqual(set(visitas.mapped('state')), {'scheduled'})
+        self.assertTrue(all(visitas.mapped('event_id')))
+        # Una segunda ejecución no duplica ocurrencias
+        Contrato._cron_generar_visitas()
+        self.assertEqual(Cita.search_count([('contrato_id', 'in', contratos.ids)]), len(visitas))
@@ -0,0 +1,44 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+
+class TicketFacturacionWizard(models.TransientModel):
+    _name = 'ticket.facturacion.wizard'
+    _description = 'Facturación masiva de tickets'
+
+    # Tickets a facturar; por defecto, los seleccionados que estén
+    # completados y aún no tengan factura
+    ticket_ids = fields.Many2many(
+        'ticket.incidencia',
+        string='Tickets',
+        default=lambda self: self._default_ticket_ids(),
+    )
+    # Modo de agrupación de las facturas
+    agrupar = fields.Selection([
+        ('partner', 'Una factura por cliente'),
+        ('ticket', 'Una factura por ticket'),
+    ],
+        string='Agrupar',
+        required=True,
+        default='partner'
+    )
+
+    @api.model
+    def _default_ticket_ids(self):
+        if self.env.context.get('active_model') != 'ticket.incidencia':
+            return self.env['ticket.incidencia']
+        tickets = self.env['ticket.incidencia'].browse(self.env.context.get('active_ids', []))
+        return tickets.filtered(lambda r: r.state == 'done' and not r.invoice_id)
+
+    def action_generar_facturas(self):
+        """
+        Genera las facturas de todos los tickets en una sola pasada
+        y abre la lista de facturas creadas.
+        """
+        self.ensure_one()
+        if not self.ticket_ids:
+            raise UserError(_("No hay tickets completados pendientes de facturar."))
+        moves = self.ticket_ids._generate_invoices(agrupar=self.agrupar)
+        action = self.env['ir.actions.act_window']._for_xml_id('account.action_move_out_invoice_type')
+        action['domain'] = [('id', 'in', moves.ids)]
+        return action